@@ -1,46 +1,100 @@
+import time
+STARTED = time.perf_counter()  # before the imports, they're part of startup
 import pygame as pg
 import sys
-from settings import WINDOW_SIZE, FLAGS, SKY_COLOR
+from settings import (WINDOW_SIZE, FLAGS, SKY_COLOR, TRACE_PATH,
+                      TICK_RATE, MAX_FPS, MAX_TICKS_PER_FRAME,
+                      CHUNK_WIDTH, BLOCK_PIXEL_SIZE)
 from scripts.resources import Resources
 from scripts.start_screen import StartScreen
-from scripts.tile_manager import TileManager
-from scripts.player import Player
 from scripts.camera import camera
+from scripts.stopwatch import Stopwatch
+from scripts.profiler import profiler, ProfilerOverlay
+
+
+TICK_MS = 1000 / TICK_RATE
 
 
 class APP:
     def __init__(self):
+        self.startup = Stopwatch(STARTED)
+        self.startup.lap("imports")
         self.window = pg.display.set_mode(WINDOW_SIZE, FLAGS)
+        self.startup.lap("window")
         self.clock = pg.time.Clock()
-        self.dt = 0
+        self.dt = 0  # ms since the last frame
+        self.accumulator = 0  # ms of frames not simulated yet
+        self.ticks = 0
         self.res = Resources()
+        self.startup.lap("fonts")
         self.mode = "start"
         self.mpos = (0, 0)
+        self.overlay = ProfilerOverlay(profiler, self.res.menufont)
+        self.show_overlay = False
+        self.path_request = None  # F7 path, drawn with the debug text
 
     def start_app(self):
         self.start_screen = StartScreen(self, self.res.menufont,
                                         120, 100, WINDOW_SIZE[0]//2)
+        self.startup.lap("start screen")
 
-    def load_map(self):
+    def open_world(self):
+        # the world code (noise, worker processes) is only imported
+        # once a map is opened, the start screen doesn't need it
+        timer = Stopwatch()
         self.res.loadtextures()
+        timer.lap("textures")
+        from scripts.tile_manager import TileManager
+        from scripts.player import Player
+        timer.lap("world modules")
         self.camera = camera((0, 0))
-
         self.player = Player(self, [200, 200],
                              self.res.playertextures["idle"])
-        self.tile_manager = TileManager(self, self.res.tile_sprs, self.camera)
-        self.tile_manager.load_map()
+        self.tile_manager = TileManager(self, self.res.tile_atlas, self.camera)
+        timer.lap("tile manager")
+        return timer
+
+    def load_map(self):
+        timer = self.open_world()
+        if not self.tile_manager.load_map():
+            return  # stays on the start screen
+        timer.lap("world")
+        print(timer.report("Loaded map"))
         self.mode = "game"
 
     def start_new_map(self):
-        self.res.loadtextures()
-        self.camera = camera((0, 0))
-        self.tile_manager = TileManager(self, self.res.tile_sprs, self.camera)
-        self.player = Player(self, [200, 200],
-                             self.res.playertextures["idle"])
+        timer = self.open_world()
         self.tile_manager.new_map()
+        timer.lap("world")
+        print(timer.report("New map"))
         self.mode = "game"
 
+    def spawn_mob(self):
+        x = self.mpos[0] + self.camera.pos[0]
+        y = self.mpos[1] + self.camera.pos[1]
+        chunkpos = x // (CHUNK_WIDTH*BLOCK_PIXEL_SIZE)
+        if chunkpos in self.tile_manager.loaded_chunks:
+            self.tile_manager.entities.spawn("mob", x, y)
+
+    def request_path(self):
+        # from the player's feet to the ground under the mouse
+        pathfinder = self.tile_manager.pathfinder
+        body = self.player.body
+        start = pathfinder.ground_at(body.x + body.w/2, body.y + body.h - 1)
+        goal = pathfinder.ground_at(self.mpos[0] + self.camera.pos[0],
+                                    self.mpos[1] + self.camera.pos[1])
+        if start is not None and goal is not None:
+            self.path_request = pathfinder.request(start, goal)
+
+    def toggle_trace(self):
+        if profiler.tracing:
+            print(f"Wrote trace to {profiler.stop_trace(TRACE_PATH)}")
+        else:
+            profiler.start_trace()
+
     def exit(self):
+        if profiler.tracing:
+            self.toggle_trace()
         if self.mode == "game":
             self.tile_manager.unload_all_chunks()
         sys.exit()
@@ -49,27 +103,52 @@ class APP:
         self.start_app()
 
         while True:
-            self.dt = self.clock.tick(60)
+            self.dt = self.clock.tick(MAX_FPS)
+            start = time.perf_counter()
             self.input()
-
+            after_input = time.perf_counter()
             self.update()
+            after_update = time.perf_counter()
             self.draw()
-
             pg.display.update()
+            profiler.frame(start, after_input, after_update,
+                           time.perf_counter())
+            if self.startup is not None:
+                self.startup.lap("first frame")
+                print(self.startup.report("Startup"))
+                self.startup = None
 
     def debug_draw(self):
         self.window.blit(self.res.menufont.render(str(
             len(self.tile_manager.loaded_chunks)) +
             " chunks", False, "green"), (0, 0))
-        self.window.blit(self.res.menufont.render("pos: " + str(
-            self.tile_manager.centerpos), False, "green"), (0, 20))
-        mbsize = str(sys.getsizeof(self.tile_manager.generated_chunks)/1024/1024)
-        self.window.blit(self.res.menufont.render("Gen_size: {}".format(mbsize[:5]),
-                                                  False, "green"), (0, 40))
+        self.window.blit(self.res.menufont.render("pos: {} entities: {}".format(
+            self.tile_manager.centerpos, len(self.tile_manager.entities)),
+            False, "green"), (0, 20))
+        generated = self.tile_manager.generated_chunks
+        self.window.blit(self.res.menufont.render(
+            "generated:{} runs:{}".format(len(generated),
+                                          generated.run_count),
+            False, "green"), (0, 40))
         self.window.blit(self.res.menufont.render("x:{} y:{} block:{}".format(
             self.player.selected_block_chunkx,
             self.player.selected_block_chunky,
             self.player.currentblock), False, "green"), (0, 60))
+        cache = self.tile_manager.cache
+        self.window.blit(self.res.menufont.render(
+            "cache:{} hit:{} miss:{} evict:{}".format(
+                len(cache), cache.hits, cache.misses, cache.evictions),
+            False, "green"), (0, 80))
+        request = self.path_request
+        if request is not None and request.done and request.path:
+            half = BLOCK_PIXEL_SIZE // 2
+            points = [(col*BLOCK_PIXEL_SIZE + half - self.camera.pos[0],
+                       row*BLOCK_PIXEL_SIZE + half - self.camera.pos[1])
+                      for col, row in request.path]
+            if len(points) > 1:
+                pg.draw.lines(self.window, "red", False, points, 2)
+        if self.show_overlay:
+            self.overlay.draw(self.window, (0, 100))
 
     def input(self):
         self.mpos = pg.mouse.get_pos()
@@ -86,17 +165,42 @@ class APP:
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_F5:
                     self.tile_manager.reset_map()
+                elif event.key == pg.K_F3:
+                    self.show_overlay = not self.show_overlay
+                elif event.key == pg.K_F2:
+                    self.toggle_trace()
+                elif event.key == pg.K_F6 and self.mode == "game":
+                    self.spawn_mob()
+                elif event.key == pg.K_F7 and self.mode == "game":
+                    self.request_path()
 
     def update(self):
         if self.mode == "game":
-            self.player.update(self.dt, self.mpos)
+            # new chunks and their surfaces, once per frame
+            self.tile_manager.update()
+            # fixed ticks for the time the frame took, so a slow frame
+            # runs more of them instead of making everything move further
+            self.accumulator = min(self.accumulator + self.dt,
+                                   MAX_TICKS_PER_FRAME*TICK_MS)
+            while self.accumulator >= TICK_MS:
+                self.tick()
+                self.accumulator -= TICK_MS
+
+    def tick(self):
+        self.player.update(TICK_MS, self.mpos)
+        self.tile_manager.entities.tick(TICK_MS/1000)
+        self.ticks += 1
 
     def draw(self):
         self.window.fill(SKY_COLOR)
         if self.mode == "start":
             self.start_screen.draw(self.window)
         elif self.mode == "game":
+            alpha = self.accumulator / TICK_MS
+            self.player.interpolate(alpha)
             self.tile_manager.draw(self.window)
+            self.tile_manager.entities.draw(self.window, self.camera.rect,
+                                            self.res.entitytextures, alpha)
             self.player.draw(self.window)
             self.debug_draw()
 
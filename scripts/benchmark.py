@@ -0,0 +1,701 @@
+"""
+Headless benchmarks for world generation, lighting, rendering, chunk
+storage, chunk loading, tile collision, entities and pathfinding.
+
+    python -m scripts.benchmark [--seeds 1 2 3] [--chunks 48]
+                                [--only terrain render ...]
+                                [--json out.json] [--compare old.json]
+    python -m scripts.benchmark --check [--only terrain ...]
+
+Every benchmark runs over the same seeds and chunk positions so the
+numbers can be compared between commits, --json writes them to a file
+and --compare prints how much faster or slower they got against one
+written before. --check runs the checks instead, they make sure the
+fast versions still give the same results as the plain ones they
+replaced.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame as pg
+import opensimplex
+from settings import (CHUNK_WIDTH, CHUNK_HEIGHT, BLOCK_PIXEL_SIZE,
+                      CHUNK_GROUND_BASE, PERLIN_MULTIPLIER)
+from scripts.chunk import Chunk
+from scripts.worldgen import (generate_chunk_terrain, generate_base_terrain,
+                              generate_ores, generate_vegetation,
+                              calculate_biome, chunk_rng, calc_block)
+from scripts.lighting import LightEngine, compute_chunk_light
+from scripts.region import (RegionStorage, encode_chunk, decode_chunk,
+                            FLAG_ZLIB)
+
+DEFAULT_SEEDS = [123456789, 987654321, 555555555]
+BENCHMARKS = {}
+CHECKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def check(name):
+    # checks raise AssertionError when something doesn't match
+    def register(fn):
+        CHECKS[name] = fn
+        return fn
+    return register
+
+
+def summarize(name, samples, **extra):
+    # samples are seconds per operation
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(q):
+        return ordered[min(len(ordered)-1, int(q * len(ordered)))]
+
+    result = {
+        "name": name,
+        "ops": len(ordered),
+        "ops_per_sec": len(ordered) / total if total else 0.0,
+        "mean_ms": total / len(ordered) * 1000,
+        "p50_ms": percentile(0.5) * 1000,
+        "p99_ms": percentile(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+    result.update(extra)
+    return result
+
+
+def timed(samples, fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    samples.append(time.perf_counter() - start)
+    return value
+
+
+class Context:
+    """
+    What the benchmarks share: the seeds, the chunk positions, the
+    loaded textures and a temporary world folder that is the working
+    directory while they run, so nothing touches the real world.
+    """
+
+    def __init__(self, seeds, chunk_count, root):
+        self.seeds = seeds
+        self.chunkposes = range(-(chunk_count//2), chunk_count - chunk_count//2)
+        self.root = root
+        self.world = tempfile.mkdtemp(prefix="pycraft_bench_")
+        os.makedirs(os.path.join(self.world, "world", "chunks"))
+        self.atlas = None
+        self.terrain = {}  # (seed, chunkpos): (tiledata, lightdata)
+
+    def seed(self, seed):
+        opensimplex.seed(seed)
+
+    def chunks(self, seed):
+        # generated terrain and light, made once and shared
+        self.seed(seed)
+        for chunkpos in self.chunkposes:
+            key = (seed, chunkpos)
+            if key not in self.terrain:
+                tiledata = generate_chunk_terrain(seed, chunkpos)
+                self.terrain[key] = (tiledata, compute_chunk_light(tiledata))
+            tiledata, lightdata = self.terrain[key]
+            yield chunkpos, tiledata.copy(), lightdata.copy()
+
+    def textures(self):
+        if self.atlas is None:
+            from scripts.resources import Resources
+            cwd = os.getcwd()
+            os.chdir(self.root)  # the textures are in appdata
+            try:
+                res = Resources()
+                res.loadtextures()
+            finally:
+                os.chdir(cwd)
+            self.atlas = res.tile_atlas
+        return self.atlas
+
+    def tile_manager(self):
+        from scripts.tile_manager import TileManager
+        from scripts.camera import camera
+        tm = TileManager(None, self.textures(), camera((0, 0)))
+        tm.storage.delete_all()
+        return tm
+
+    def close(self):
+        shutil.rmtree(self.world, ignore_errors=True)
+
+
+@benchmark("terrain")
+def bench_terrain(ctx):
+    samples = []
+    for seed in ctx.seeds:
+        ctx.seed(seed)
+        for chunkpos in ctx.chunkposes:
+            timed(samples, generate_chunk_terrain, seed, chunkpos)
+    return summarize("terrain", samples)
+
+
+def base_terrain(seed, chunkpos):
+    # what generate_chunk_terrain makes before the ores and plants
+    xstart = chunkpos * CHUNK_WIDTH
+    biome_tile, biome_tile2 = calculate_biome(xstart/CHUNK_WIDTH/64, 4)
+    return (generate_base_terrain(chunkpos, biome_tile, biome_tile2),
+            biome_tile)
+
+
+@check("terrain")
+def check_terrain(ctx, chunk_count=8):
+    # the batched base terrain against calc_block one tile at a time,
+    # with the ground levels from scalar noise2 calls like it used to be
+    for seed in ctx.seeds:
+        ctx.seed(seed)
+        for chunkpos in ctx.chunkposes[:chunk_count]:
+            tiledata, biome_tile = base_terrain(seed, chunkpos)
+            _, biome_tile2 = calculate_biome(chunkpos/64, 4)
+            for x in range(CHUNK_WIDTH):
+                wx = (chunkpos*CHUNK_WIDTH + x) * 0.6
+                ground = CHUNK_GROUND_BASE - int(opensimplex.noise2(
+                    x=wx/CHUNK_WIDTH/2, y=5) * PERLIN_MULTIPLIER)
+                for y in range(CHUNK_HEIGHT):
+                    expected = calc_block(wx, y, ground,
+                                          biome_tile, biome_tile2)
+                    assert tiledata[y, x] == expected, (
+                        f"seed {seed} chunk {chunkpos} tile {x},{y}: "
+                        f"{tiledata[y, x]} instead of {expected}")
+
+
+@benchmark("ores")
+def bench_ores(ctx):
+    samples = []
+    for seed in ctx.seeds:
+        ctx.seed(seed)
+        for chunkpos in ctx.chunkposes:
+            tiledata, _ = base_terrain(seed, chunkpos)
+            timed(samples, generate_ores, tiledata, chunk_rng(seed, chunkpos))
+    return summarize("ores", samples)
+
+
+@benchmark("vegetation")
+def bench_vegetation(ctx):
+    samples = []
+    for seed in ctx.seeds:
+        ctx.seed(seed)
+        for chunkpos in ctx.chunkposes:
+            tiledata, biome_tile = base_terrain(seed, chunkpos)
+            rng = chunk_rng(seed, chunkpos)
+            generate_ores(tiledata, rng)
+            timed(samples, generate_vegetation, tiledata, biome_tile, rng)
+    return summarize("vegetation", samples)
+
+
+@benchmark("light")
+def bench_light(ctx):
+    samples = []
+    for seed in ctx.seeds:
+        for _, tiledata, _ in ctx.chunks(seed):
+            timed(samples, compute_chunk_light, tiledata)
+    return summarize("light", samples)
+
+
+@benchmark("light_edit")
+def bench_light_edit(ctx):
+    # digging and placing blocks with every chunk loaded
+    samples = []
+    for seed in ctx.seeds:
+        chunks = {c: Chunk(c, t, l) for c, t, l in ctx.chunks(seed)}
+        engine = LightEngine(chunks)
+        for chunkpos in chunks:
+            engine.add_chunk(chunkpos)
+        rng = random.Random(seed)
+        first = ctx.chunkposes[0]
+        for _ in range(200):
+            wx = rng.randrange(first*CHUNK_WIDTH,
+                               (ctx.chunkposes[-1]+1)*CHUNK_WIDTH)
+            y = rng.randrange(CHUNK_HEIGHT-1)
+            chunk = chunks[wx // CHUNK_WIDTH]
+            old_tile = int(chunk.tiledata[y, wx % CHUNK_WIDTH])
+            chunk.tiledata[y, wx % CHUNK_WIDTH] = 0 if old_tile else 3
+            timed(samples, engine.update_block, wx, y, old_tile)
+    return summarize("light_edit", samples)
+
+
+@benchmark("light_column")
+def bench_light_column(ctx, columns=10):
+    # the worst case for remove and relight: digging a column out from
+    # the top down to bedrock and filling it back in from the bottom,
+    # every edit lets the sky further down or takes it away again
+    samples = []
+    for seed in ctx.seeds:
+        chunks = {c: Chunk(c, t, l) for c, t, l in ctx.chunks(seed)}
+        engine = LightEngine(chunks)
+        for chunkpos in chunks:
+            engine.add_chunk(chunkpos)
+        rng = random.Random(seed)
+        for _ in range(columns):
+            wx = rng.randrange(ctx.chunkposes[0]*CHUNK_WIDTH,
+                               (ctx.chunkposes[-1]+1)*CHUNK_WIDTH)
+            chunk = chunks[wx // CHUNK_WIDTH]
+            x = wx % CHUNK_WIDTH
+            tiles = [int(t) for t in chunk.tiledata[:, x]]
+            for y in range(CHUNK_HEIGHT-1):
+                if tiles[y]:
+                    chunk.tiledata[y, x] = 0
+                    timed(samples, engine.update_block, wx, y, tiles[y])
+            for y in reversed(range(CHUNK_HEIGHT-1)):
+                if tiles[y]:
+                    chunk.tiledata[y, x] = tiles[y]
+                    timed(samples, engine.update_block, wx, y, 0)
+    return summarize("light_column", samples)
+
+
+def full_light(chunks):
+    # light of every chunk worked out again from its tiles alone
+    fresh = {c: Chunk(c, chunk.tiledata.copy())
+             for c, chunk in chunks.items()}
+    engine = LightEngine(fresh)
+    for chunkpos in fresh:
+        engine.light_chunk(chunkpos)
+    for chunkpos in fresh:
+        engine.add_chunk(chunkpos)
+    return fresh
+
+
+@check("light_edit")
+def check_light_edit(ctx, chunk_count=7, edits=300):
+    # light after lots of single tile edits, digging down a whole column
+    # and filling it back in, and after chunks are unloaded and loaded
+    # again while their neighbour changed, against lighting the result
+    # from scratch
+    for seed in ctx.seeds:
+        chunks = {c: Chunk(c, t, l) for c, t, l
+                  in ctx.chunks(seed) if c in ctx.chunkposes[:chunk_count]}
+        engine = LightEngine(chunks)
+        for chunkpos in chunks:
+            engine.add_chunk(chunkpos)
+        rng = random.Random(seed)
+        first = ctx.chunkposes[0]*CHUNK_WIDTH
+        last = (ctx.chunkposes[0] + len(chunks))*CHUNK_WIDTH - 1
+
+        def edit(wx, y, tile):
+            chunk = chunks[wx // CHUNK_WIDTH]
+            old_tile = int(chunk.tiledata[y, wx % CHUNK_WIDTH])
+            chunk.tiledata[y, wx % CHUNK_WIDTH] = tile
+            engine.update_block(wx, y, old_tile)
+
+        for _ in range(edits):
+            wx = rng.randint(first, last)
+            y = rng.randrange(CHUNK_HEIGHT-1)
+            edit(wx, y, 0 if chunks[wx // CHUNK_WIDTH].tiledata[
+                y, wx % CHUNK_WIDTH] else 3)
+        wx = rng.randint(first, last)
+        for y in range(CHUNK_HEIGHT-1):
+            edit(wx, y, 0)
+        for y in reversed(range(CHUNK_HEIGHT//2, CHUNK_HEIGHT-1)):
+            edit(wx, y, 3)
+
+        compare_light(seed, chunks, "after edits")
+
+        # a shaft in one chunk and a tunnel from it into the next one,
+        # the next one is unloaded, the shaft is closed and it comes
+        # back with the light it had, like from the cache or a region
+        middle = ctx.chunkposes[0] + len(chunks)//2
+        shaft = middle*CHUNK_WIDTH - 1
+        depth = CHUNK_HEIGHT//2
+        for y in range(depth + 1):
+            edit(shaft, y, 0)
+        for wx in range(shaft + 1, shaft + CHUNK_WIDTH//2):
+            edit(wx, depth, 0)
+        unloaded = chunks.pop(middle)
+        for y in range(depth):
+            edit(shaft, y, 3)
+        chunks[middle] = unloaded
+        engine.add_chunk(middle)
+        compare_light(seed, chunks, "after reloading next to a closed shaft")
+        # and the other way, the shaft opens while the tunnel is unloaded
+        unloaded = chunks.pop(middle)
+        for y in range(depth):
+            edit(shaft, y, 0)
+        chunks[middle] = unloaded
+        engine.add_chunk(middle)
+        compare_light(seed, chunks, "after reloading next to an open shaft")
+
+
+def compare_light(seed, chunks, when):
+    expected = full_light(chunks)
+    for chunkpos, chunk in chunks.items():
+        wrong = (chunk.lightdata != expected[chunkpos].lightdata).sum()
+        assert not wrong, (f"seed {seed} chunk {chunkpos} {when}: {wrong} "
+                           "tiles have other light than a full relight")
+
+
+@benchmark("render")
+def bench_render(ctx):
+    from scripts.chunk_renderer import ChunkRenderer
+    renderer = ChunkRenderer(ctx.textures())
+    samples = []
+    image_bytes = 0
+    for seed in ctx.seeds:
+        for _, tiledata, lightdata in ctx.chunks(seed):
+            image = timed(samples, renderer.render, tiledata, lightdata)
+            image_bytes += image.nbytes()
+    return summarize("render", samples,
+                     image_bytes_per_chunk=image_bytes / len(samples))
+
+
+@benchmark("storage")
+def bench_storage(ctx):
+    # save every chunk on its own then read them back
+    storage = RegionStorage(os.path.join(ctx.world, "world", "chunks"))
+    saves = []
+    loads = []
+    for seed in ctx.seeds:
+        storage.delete_all()
+        chunks = [Chunk(c, t, l, edited=True) for c, t, l in ctx.chunks(seed)]
+        for chunk in chunks:
+            timed(saves, storage.save_chunks, [chunk])
+        for chunk in chunks:
+            timed(loads, storage.load_chunk, chunk.chunkpos)
+    payload = sum(len(encode_chunk(c)[0]) for c in chunks) / len(chunks)
+    return [summarize("storage_save", saves, payload_bytes=payload),
+            summarize("storage_load", loads, payload_bytes=payload)]
+
+
+@check("storage")
+def check_storage(ctx):
+    # chunks saved into region files come back the same, compressed or
+    # not, saved together or one after the other into the same region,
+    # and the payloads from before sections still read
+    for compress_level in (6, 0):
+        storage = RegionStorage(os.path.join(ctx.world, "world", "chunks"),
+                                compress_level)
+        for seed in ctx.seeds:
+            storage.delete_all()
+            chunks = [Chunk(c, t, l, [{"type": "mob", "x": c}], edited=True)
+                      for c, t, l in ctx.chunks(seed)]
+            half = len(chunks) // 2
+            storage.save_chunks(chunks[:half])
+            for chunk in chunks[half:]:
+                storage.save_chunks([chunk])
+            for chunk in chunks:
+                loaded = storage.load_chunk(chunk.chunkpos)
+                assert loaded is not None, f"chunk {chunk.chunkpos} missing"
+                for attr in ("tiledata", "lightdata"):
+                    assert (getattr(loaded, attr) ==
+                            getattr(chunk, attr)).all(), (
+                        f"seed {seed} chunk {chunk.chunkpos} {attr} differs")
+                assert loaded.entitydata == chunk.entitydata, (
+                    f"seed {seed} chunk {chunk.chunkpos} entitydata differs")
+            assert storage.load_chunk(chunks[-1].chunkpos + 1) is None
+    chunk = chunks[0]
+    old_payload = zlib.compress(chunk.tiledata.tobytes() +
+                                chunk.lightdata.tobytes() + b"[]")
+    loaded = decode_chunk(chunk.chunkpos, old_payload, FLAG_ZLIB)
+    assert (loaded.tiledata == chunk.tiledata).all(), "old tiledata differs"
+    assert (loaded.lightdata == chunk.lightdata).all(), "old lightdata differs"
+
+
+@benchmark("load_unload")
+def bench_load_unload(ctx):
+    # TileManager round trip: read the chunk from disk, light and render
+    # it on commit, then unload it again, with the cache kept empty
+    tm = ctx.tile_manager()
+    loads = []
+    unloads = []
+    chunk_bytes = []
+    try:
+        for seed in ctx.seeds:
+            tm.seed = seed
+            tm.storage.save_chunks([Chunk(c, t, l, edited=True)
+                                    for c, t, l in ctx.chunks(seed)])
+            for chunkpos in ctx.chunkposes:
+                tm.cache.clear()
+                tm.centerpos = chunkpos
+                timed(loads, lambda: (tm.loadchunk(chunkpos),
+                                      tm.commit_chunks(),
+                                      tm.render_pending()))
+                chunk = tm.loaded_chunks[chunkpos]
+                chunk_bytes.append(chunk.nbytes() + chunk.image.nbytes())
+                chunk.mark_edited()  # so unloading saves it
+                timed(unloads, lambda: (tm.unload_chunk(chunkpos),
+                                        tm.commit_chunks()))
+            tm.writer.flush()
+    finally:
+        tm.writer.stop()
+    return [summarize("chunk_load", loads,
+                      bytes_per_chunk=sum(chunk_bytes) / len(chunk_bytes)),
+            summarize("chunk_unload", unloads)]
+
+
+@benchmark("walk")
+def bench_walk(ctx, chunks_to_walk=24, speed=16):
+    # the player walking right at speed pixels a frame, 60 frames a
+    # second, with the chunk thread and generator processes running.
+    # times the main thread's update() + draw() per frame
+    from scripts.chunk_generator import ChunkGenerator
+    surf = pg.Surface((500, 500))
+    samples = []
+    missing = 0
+    chunk_bytes = []
+    for seed in ctx.seeds:
+        tm = ctx.tile_manager()
+        tm.seed = seed
+        ctx.seed(seed)
+        tm.generator = ChunkGenerator(seed, on_failed=tm.generation_failed)
+        tm.inmap = True
+        tm.thread = tm.manage_chunks()
+        try:
+            x = 0
+            end = chunks_to_walk*CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+            while x < end:
+                frame_start = time.perf_counter()
+                tm.set_centerpos(x)
+                tm.camera.follow((x, 300))
+                timed(samples, lambda: (tm.update(), tm.draw(surf)))
+                if any(c not in tm.loaded_chunks
+                       for c in range(tm.centerpos-1, tm.centerpos+2)):
+                    missing += 1
+                x += speed
+                time.sleep(max(0, 1/60 - (time.perf_counter() - frame_start)))
+            chunk_bytes.extend(c.nbytes() + c.image.nbytes()
+                               for c in tm.loaded_chunks.values()
+                               if c.image is not None)
+        finally:
+            tm.stop_manage_chunks()
+            tm.generator.shutdown()
+            tm.writer.stop()
+    return summarize("walk_frame", samples, frames_missing_chunks=missing,
+                     bytes_per_chunk=sum(chunk_bytes) / len(chunk_bytes))
+
+
+@benchmark("physics")
+def bench_physics(ctx, bodies=2000, ticks=120):
+    # thousands of player sized bodies dropped over the terrain and
+    # walking both ways, one TileCollider.step each per tick
+    from scripts.physics import Body, TileCollider
+    samples = []
+    grounded = 0
+    for seed in ctx.seeds:
+        collider = TileCollider({c: Chunk(c, t, l)
+                                 for c, t, l in ctx.chunks(seed)})
+        rng = random.Random(seed)
+        left = ctx.chunkposes[0]*CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+        right = (ctx.chunkposes[-1]+1)*CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+        group = []
+        for _ in range(bodies):
+            body = Body(rng.uniform(left, right - 12),
+                        rng.uniform(0, 10*BLOCK_PIXEL_SIZE), 12, 16)
+            body.vx = rng.choice((-300, 300))
+            group.append(body)
+
+        def tick():
+            for body in group:
+                collider.step(body, 1/60)
+        for _ in range(ticks):
+            timed(samples, tick)
+        grounded += sum(body.on_ground for body in group)
+    total = sum(samples)
+    return summarize("physics_tick", samples, bodies=bodies,
+                     bodies_per_sec=bodies*len(samples) / total,
+                     on_ground=grounded / (bodies*len(ctx.seeds)))
+
+
+@benchmark("entities")
+def bench_entities(ctx, mobs=500, ticks=120):
+    # hundreds of mobs walking around, a tick of all of them and a
+    # neighbour query around every one of them
+    from scripts.physics import TileCollider
+    from scripts.entities import EntityManager
+    ticks_taken = []
+    queries = []
+    for seed in ctx.seeds:
+        entities = EntityManager(TileCollider(
+            {c: Chunk(c, t, l) for c, t, l in ctx.chunks(seed)}))
+        rng = random.Random(seed)
+        left = ctx.chunkposes[0]*CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+        right = (ctx.chunkposes[-1]+1)*CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+        for _ in range(mobs):
+            entities.spawn("mob", rng.uniform(left, right - 12),
+                           rng.uniform(0, 10*BLOCK_PIXEL_SIZE))
+        for _ in range(ticks):
+            timed(ticks_taken, entities.tick, 1/60)
+            timed(queries, lambda: [
+                entities.near(e.x, e.y, 4*BLOCK_PIXEL_SIZE)
+                for e in entities.entities.values()])
+    return [summarize("entity_tick", ticks_taken, mobs=mobs),
+            summarize("entity_near", queries, queries=mobs)]
+
+
+@benchmark("pathfinding")
+def bench_pathfinding(ctx, queries=40):
+    # paths between the ground at random columns at least half of the
+    # chunks apart, found from scratch and then again from the cache.
+    # Some find nothing, a ravine too deep to climb out of splits the
+    # world, those look at every tile they can reach first
+    from scripts.physics import TileCollider
+    from scripts.pathfinding import Pathfinder
+    cold = []
+    cached = []
+    lengths = []
+    for seed in ctx.seeds:
+        chunks = {c: Chunk(c, t, l) for c, t, l in ctx.chunks(seed)}
+        pathfinder = Pathfinder(TileCollider(chunks))
+        rng = random.Random(seed)
+        first = ctx.chunkposes[0]*CHUNK_WIDTH
+        last = (ctx.chunkposes[-1]+1)*CHUNK_WIDTH - 1
+        span = last - first
+        pairs = []
+        while len(pairs) < queries:
+            a = rng.randint(first, last - span//2)
+            b = rng.randint(a + span//2, last)
+            start, goal = pathfinder.ground(a, 0), pathfinder.ground(b, 0)
+            if start is not None and goal is not None:
+                pairs.append((start, goal) if rng.random() < 0.5
+                             else (goal, start))
+        for start, goal in pairs:
+            path = timed(cold, pathfinder.find_path, start, goal)
+            if path:
+                lengths.append(len(path))
+        for start, goal in pairs:
+            timed(cached, pathfinder.find_path, start, goal)
+    return [summarize("path_cold", cold,
+                      found_percent=len(lengths) / len(cold) * 100,
+                      path_length=(sum(lengths) / len(lengths)
+                                   if lengths else 0)),
+            summarize("path_cached", cached)]
+
+
+def git_commit(root):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=root, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def context(seeds, chunk_count, root):
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    ctx = Context(seeds, chunk_count, root)
+    cwd = os.getcwd()
+    os.chdir(ctx.world)
+    try:
+        yield ctx
+    finally:
+        os.chdir(cwd)
+        ctx.close()
+
+
+def run(names, seeds, chunk_count):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    with context(seeds, chunk_count, root) as ctx:
+        for name in names:
+            # the game prints a line for every chunk it loads
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = BENCHMARKS[name](ctx)
+            for r in result if isinstance(result, list) else [result]:
+                print(format_result(r))
+                results.append(r)
+    return {
+        "meta": {
+            "commit": git_commit(root),
+            "python": platform.python_version(),
+            "pygame": pg.version.ver,
+            "platform": platform.platform(),
+            "seeds": seeds,
+            "chunks": chunk_count,
+            "chunk_size": [CHUNK_WIDTH, CHUNK_HEIGHT],
+        },
+        "results": results,
+    }
+
+
+def run_checks(names, seeds, chunk_count):
+    # returns the number of checks that failed
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    failed = 0
+    with context(seeds, chunk_count, root) as ctx:
+        for name in names:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    CHECKS[name](ctx)
+            except AssertionError as e:
+                print(f"{name:<14} FAILED {e}")
+                failed += 1
+            else:
+                print(f"{name:<14} ok")
+    return failed
+
+
+def format_result(r):
+    extra = ", ".join("{} {:.0f}".format(k, v) for k, v in r.items()
+                      if k not in ("name", "ops", "ops_per_sec", "mean_ms",
+                                   "p50_ms", "p99_ms", "max_ms"))
+    return "{:<14} {:>6} ops {:>10.1f} ops/s  p50 {:>8.3f} ms  p99 {:>8.3f} ms{}".format(
+        r["name"], r["ops"], r["ops_per_sec"], r["p50_ms"], r["p99_ms"],
+        "  " + extra if extra else "")
+
+
+def compare(report, old_path):
+    with open(old_path, "r") as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"\ncompared to {old_path}:")
+    for r in report["results"]:
+        before = old.get(r["name"])
+        if before is None or not before["ops_per_sec"]:
+            continue
+        print("{:<14} {:>6.2f}x ops/s  p99 {:.3f} -> {:.3f} ms".format(
+            r["name"], r["ops_per_sec"] / before["ops_per_sec"],
+            before["p99_ms"], r["p99_ms"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless benchmarks for pycraft")
+    parser.add_argument("--seeds", type=int, nargs="+", default=DEFAULT_SEEDS)
+    parser.add_argument("--chunks", type=int, default=48,
+                        help="chunks per seed")
+    parser.add_argument("--only", nargs="+",
+                        choices=sorted(set(BENCHMARKS) | set(CHECKS)))
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of an earlier run")
+    parser.add_argument("--check", action="store_true",
+                        help="run the checks instead of the benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        names = [n for n in args.only or CHECKS if n in CHECKS]
+        if run_checks(names, args.seeds, args.chunks):
+            sys.exit(1)
+        return
+    names = [n for n in args.only or BENCHMARKS if n in BENCHMARKS]
+    report = run(names, args.seeds, args.chunks)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,11 +1,28 @@
+from pygame import rect
+from settings import WINDOW_SIZE
+
 
 class camera:
-    def __init__(self, pos):
+    def __init__(self, pos, size=WINDOW_SIZE):
         self.pos = pos
+        self.size = size  # size of the surface the world is drawn on
 
     def update_pos(self, pos):
         self.pos = pos
 
+    def resize(self, size):
+        self.size = size
+
+    def follow(self, pos):
+        # puts pos in the middle of the screen
+        self.update_pos((int(pos[0] - self.size[0]//2),
+                         int(pos[1] - self.size[1]//2)))
+
+    @property
+    def rect(self):
+        # the part of the world that is on screen, in pixels
+        return rect.Rect(self.pos, self.size)
+
     def __repr__(self):
         return str(self.__class__) + ": " + str(self.__dict__)
 
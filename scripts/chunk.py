@@ -0,0 +1,60 @@
+import numpy as np
+from settings import CHUNK_WIDTH, CHUNK_HEIGHT
+
+# tile ids and light levels both fit in a byte
+TILE_DTYPE = np.uint8
+LIGHT_DTYPE = np.uint8
+
+
+def new_tiledata():
+    return np.zeros((CHUNK_HEIGHT, CHUNK_WIDTH), dtype=TILE_DTYPE)
+
+
+def new_lightdata():
+    return np.zeros((CHUNK_HEIGHT, CHUNK_WIDTH), dtype=LIGHT_DTYPE)
+
+
+class Chunk:
+    # tiledata and lightdata are indexed [y, x] like the old nested lists,
+    # y: 0 is the top of the chunk
+    # edited is False for chunks that are exactly what the generator made,
+    # those don't get saved since they can be generated again from the seed
+    # dirty means it changed since it was last saved
+    __slots__ = ("chunkpos", "tiledata", "lightdata", "entitydata", "image",
+                 "edited", "dirty")
+
+    def __init__(self, chunkpos, tiledata=None, lightdata=None,
+                 entitydata=None, image=None, edited=False, dirty=False):
+        self.chunkpos = chunkpos
+        self.tiledata = tiledata if tiledata is not None else new_tiledata()
+        self.lightdata = (lightdata if lightdata is not None
+                          else new_lightdata())
+        self.entitydata = entitydata if entitydata is not None else []
+        self.image = image
+        self.edited = edited
+        self.dirty = dirty
+
+    @classmethod
+    def from_json(cls, chunkpos, data):
+        return cls(chunkpos,
+                   np.array(data["tiledata"], dtype=TILE_DTYPE),
+                   np.array(data["lightdata"], dtype=LIGHT_DTYPE),
+                   data["entitydata"], edited=True)
+
+    def mark_edited(self):
+        self.edited = True
+        self.dirty = True
+
+    def snapshot(self):
+        # copy of the data that gets saved, without the image
+        return Chunk(self.chunkpos, self.tiledata.copy(),
+                     self.lightdata.copy(), list(self.entitydata),
+                     edited=self.edited)
+
+    def nbytes(self):
+        # size of the tile arrays, the image is not counted
+        return self.tiledata.nbytes + self.lightdata.nbytes
+
+    def __repr__(self):
+        return "<Chunk {} image={} edited={} dirty={}>".format(
+            self.chunkpos, self.image is not None, self.edited, self.dirty)
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import threading
+from settings import (CHUNK_CACHE_SIZE, CHUNK_CACHE_BYTES,
+                      CHUNK_CACHE_SURFACES)
+
+
+class ChunkCache:
+    """
+    Keeps the most recently unloaded chunks in memory so walking back
+    and forth over the chunk radius doesn't go to the disk or the
+    generator every time. Limited by chunk count and by bytes, the
+    least recently unloaded chunk is thrown out first.
+    """
+
+    def __init__(self, max_chunks=CHUNK_CACHE_SIZE,
+                 max_bytes=CHUNK_CACHE_BYTES,
+                 keep_surfaces=CHUNK_CACHE_SURFACES):
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.keep_surfaces = keep_surfaces
+        self.chunks = OrderedDict()  # chunkpos: chunk, oldest first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def chunk_bytes(self, chunk):
+        image = chunk.image
+        return chunk.nbytes() + (image.nbytes() if image is not None else 0)
+
+    def put(self, chunk):
+        if not self.keep_surfaces:
+            chunk.image = None
+        with self.lock:
+            old = self.chunks.pop(chunk.chunkpos, None)
+            if old is not None:
+                self.size -= self.chunk_bytes(old)
+            self.chunks[chunk.chunkpos] = chunk
+            self.size += self.chunk_bytes(chunk)
+            while self.chunks and (len(self.chunks) > self.max_chunks or
+                                   self.size > self.max_bytes):
+                _, evicted = self.chunks.popitem(last=False)
+                self.size -= self.chunk_bytes(evicted)
+                self.evictions += 1
+
+    def take(self, chunkpos):
+        # the chunk is removed, it's going back into loaded_chunks
+        with self.lock:
+            chunk = self.chunks.pop(chunkpos, None)
+            if chunk is None:
+                self.misses += 1
+                return None
+            self.size -= self.chunk_bytes(chunk)
+            self.hits += 1
+            return chunk
+
+    def clear(self):
+        with self.lock:
+            self.chunks.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.chunks)
@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import threading
+import time
+import opensimplex
+from settings import CHUNK_GEN_WORKERS
+from scripts.worldgen import generate_chunk_terrain, generate_lightdata
+from scripts.profiler import profiler
+
+_worker_seed = None
+
+
+def generate_chunk_job(seed, chunkpos):
+    # runs inside a worker process, also returns how long it took
+    global _worker_seed
+    start = time.perf_counter()
+    if _worker_seed != seed:
+        opensimplex.seed(seed)
+        _worker_seed = seed
+    tiledata = generate_chunk_terrain(seed, chunkpos)
+    lightdata = generate_lightdata(tiledata)
+    return chunkpos, tiledata, lightdata, time.perf_counter() - start
+
+
+class ChunkGenerator:
+    """
+    Generates chunks in a process pool so terrain generation doesn't
+    hold the GIL the render loop needs.
+    Chunks are kept in a priority queue and only a few jobs are handed
+    to the pool at a time, that way the closest chunks always go first
+    and jobs for chunks we walked away from can still be cancelled.
+    Finished chunks are collected with poll() from the main thread,
+    on_failed(chunkpos) is called on the pool's thread when a job fails.
+    """
+
+    def __init__(self, seed, workers=CHUNK_GEN_WORKERS, on_failed=None):
+        self.seed = seed
+        self.workers = workers
+        self.on_failed = on_failed
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.lock = threading.RLock()
+        self.queue = []  # heap of (priority, chunkpos)
+        self.queued = set()
+        self.running = {}  # chunkpos: future
+        self.results = []
+
+    def request(self, chunkpos, priority):
+        with self.lock:
+            if chunkpos in self.queued or chunkpos in self.running:
+                return
+            self.queued.add(chunkpos)
+            heapq.heappush(self.queue, (priority, chunkpos))
+        self.submit_jobs()
+
+    def reprioritize(self, center, radius, direction=0):
+        # drops everything outside of the radius and sorts the
+        # rest by distance to center, chunks in the direction the
+        # player is walking win ties
+        with self.lock:
+            wanted = [c for c in self.queued if abs(c - center) <= radius]
+            self.queued = set(wanted)
+            self.queue = [(self.priority(c, center, direction), c)
+                          for c in wanted]
+            heapq.heapify(self.queue)
+
+            for chunkpos, future in list(self.running.items()):
+                if abs(chunkpos - center) > radius:
+                    # if it already started the result is thrown away
+                    future.cancel()
+                    self.running.pop(chunkpos)
+        self.submit_jobs()
+
+    @staticmethod
+    def priority(chunkpos, center, direction=0):
+        offset = chunkpos - center
+        priority = abs(offset)
+        if direction and offset * direction > 0:
+            priority -= 0.5
+        return priority
+
+    def submit_jobs(self):
+        with self.lock:
+            # keep the pool busy but don't give it the whole queue
+            while self.queue and len(self.running) < self.workers * 2:
+                _, chunkpos = heapq.heappop(self.queue)
+                self.queued.discard(chunkpos)
+                future = self.executor.submit(generate_chunk_job,
+                                              self.seed, chunkpos)
+                self.running[chunkpos] = future
+                future.add_done_callback(
+                    lambda f, c=chunkpos: self.job_done(c, f))
+
+    def job_done(self, chunkpos, future):
+        if future.cancelled():
+            return
+        with self.lock:
+            if self.running.get(chunkpos) is not future:
+                return  # got cancelled while the worker was on it
+            self.running.pop(chunkpos)
+            try:
+                chunkpos, tiledata, lightdata, seconds = future.result()
+                profiler.record("generate", seconds)
+                self.results.append((chunkpos, tiledata, lightdata))
+                failed = False
+            except Exception as e:
+                print(f"Generating chunk {chunkpos} failed: {e}")
+                failed = True
+        self.submit_jobs()
+        if failed and self.on_failed is not None:
+            # so whoever wanted the chunk can ask for it again
+            self.on_failed(chunkpos)
+
+    def poll(self):
+        with self.lock:
+            results, self.results = self.results, []
+        return results
+
+    def pending_count(self):
+        with self.lock:
+            return len(self.queued) + len(self.running)
+
+    def clear(self):
+        with self.lock:
+            self.queue = []
+            self.queued = set()
+            for future in self.running.values():
+                future.cancel()
+            self.running = {}
+            self.results = []
+
+    def shutdown(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
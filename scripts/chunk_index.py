@@ -0,0 +1,58 @@
+class GeneratedChunks:
+    """
+    Which chunk x positions have been generated before.
+    A set in memory so lookups are O(1) and there are no duplicates,
+    saved in info.json as [start, end] runs since generated chunks
+    are almost always one long strip around where the player spawned.
+    """
+
+    def __init__(self, chunks=()):
+        self.chunks = set(chunks)
+        # kept up to date in add() so the debug screen doesn't sort
+        # the whole set every frame
+        self.run_count = len(self.runs())
+
+    def add(self, chunkpos):
+        chunks = self.chunks
+        if chunkpos in chunks:
+            return
+        # a new run, unless it joins one or two that are already there
+        self.run_count += (1 - (chunkpos - 1 in chunks) -
+                           (chunkpos + 1 in chunks))
+        chunks.add(chunkpos)
+
+    def __contains__(self, chunkpos):
+        return chunkpos in self.chunks
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __iter__(self):
+        return iter(sorted(self.chunks))
+
+    def runs(self):
+        runs = []
+        for chunkpos in sorted(self.chunks):
+            if runs and runs[-1][1] == chunkpos - 1:
+                runs[-1][1] = chunkpos
+            else:
+                runs.append([chunkpos, chunkpos])
+        return runs
+
+    def to_json(self):
+        return self.runs()
+
+    @classmethod
+    def from_json(cls, data):
+        # old saves have a plain list of chunk positions with duplicates
+        chunks = set()
+        for item in data:
+            if isinstance(item, list):
+                chunks.update(range(item[0], item[1] + 1))
+            else:
+                chunks.add(item)
+        return cls(chunks)
+
+    def __repr__(self):
+        return "<GeneratedChunks {} chunks in {} runs>".format(
+            len(self.chunks), self.run_count)
@@ -0,0 +1,115 @@
+from collections import deque
+from types import MappingProxyType
+import threading
+
+LOAD = "load"
+UNLOAD = "unload"
+
+
+class ChunkRegistry:
+    """
+    Owns the loaded chunks.
+
+    Only the main thread changes it, and only in commit(). Other
+    threads (the chunk manager, anything that gets chunks from the
+    generator) ask for a chunk to be added or removed with
+    request_load/request_unload, and read the loaded chunks through
+    snapshot(). A snapshot is a read only mapping that is never
+    changed, commit() swaps in a new one, so iterating it from
+    another thread can't break halfway through.
+
+    A chunk with a request that hasn't been committed (and handled)
+    yet is "in transit", nobody should start loading or unloading it
+    again until it's done. snapshot_with_transit() gives both at once,
+    read separately a commit in between could make a chunk look like
+    it's neither loaded nor on its way.
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.view = MappingProxyType({})
+        self.lock = threading.Lock()
+        self.requests = deque()
+        self.transit = set()
+
+    def request_load(self, chunk):
+        with self.lock:
+            self.transit.add(chunk.chunkpos)
+            self.requests.append((LOAD, chunk))
+
+    def request_unload(self, chunkpos):
+        with self.lock:
+            self.transit.add(chunkpos)
+            self.requests.append((UNLOAD, chunkpos))
+
+    def snapshot(self):
+        return self.view
+
+    def snapshot_with_transit(self):
+        # (snapshot, chunk positions in transit) as of the same moment
+        with self.lock:
+            return self.view, frozenset(self.transit)
+
+    def commit(self, accept, on_load, on_unload):
+        # main thread only, applies every request in order.
+        # accept(chunk) can turn a load down, on_load(chunk) runs after
+        # the chunk is in, on_unload(chunk) after it's out but before
+        # other threads can see that it's gone.
+        # returns the chunk positions that were handled
+        with self.lock:
+            requests, self.requests = self.requests, deque()
+        if not requests:
+            return set()
+
+        done = set()
+        for action, item in requests:
+            if action == LOAD:
+                done.add(item.chunkpos)
+                if item.chunkpos in self.chunks or not accept(item):
+                    continue
+                self.chunks[item.chunkpos] = item
+                on_load(item)
+            else:
+                done.add(item)
+                chunk = self.chunks.pop(item, None)
+                if chunk is not None:
+                    on_unload(chunk)
+
+        view = MappingProxyType(dict(self.chunks))
+        with self.lock:
+            # the new snapshot and the transit set change together
+            self.view = view
+            # something could have asked again while we were busy
+            waiting = {r[1].chunkpos if r[0] == LOAD else r[1]
+                       for r in self.requests}
+            self.transit -= done - waiting
+        return done
+
+    def clear(self):
+        with self.lock:
+            self.requests.clear()
+            self.transit.clear()
+            self.view = MappingProxyType({})
+        self.chunks.clear()
+
+    # read access for the main thread
+    def get(self, chunkpos, default=None):
+        return self.chunks.get(chunkpos, default)
+
+    def __getitem__(self, chunkpos):
+        return self.chunks[chunkpos]
+
+    def __contains__(self, chunkpos):
+        return chunkpos in self.chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def values(self):
+        return self.chunks.values()
+
+    def items(self):
+        return self.chunks.items()
@@ -0,0 +1,140 @@
+import numpy as np
+from pygame import surface, draw
+from settings import (CHUNK_WIDTH, BLOCK_PIXEL_SIZE, SKY_COLOR,
+                      LIGHT_LEVELS, SECTION_HEIGHT, SECTIONS)
+from scripts.tiles import TILES, TEXTURE
+
+SECTION_SIZE = (CHUNK_WIDTH*BLOCK_PIXEL_SIZE, SECTION_HEIGHT*BLOCK_PIXEL_SIZE)
+
+
+def surface_bytes(surf):
+    if surf is None:
+        return 0
+    return surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+
+class ChunkImage:
+    # one surface per section, top first. None is a section with nothing
+    # but sky, sections that are the same tile and light all the way
+    # through use a surface shared with every other chunk (in shared),
+    # those must never be drawn on
+    __slots__ = ("sections", "shared")
+
+    def __init__(self):
+        self.sections = [None] * SECTIONS
+        self.shared = set()
+
+    def nbytes(self):
+        return sum(surface_bytes(surf)
+                   for s, surf in enumerate(self.sections)
+                   if s not in self.shared)
+
+
+class ChunkRenderer:
+    """
+    Turns chunk arrays into chunk images.
+    Every tile is shaded once for every light level up front, in the
+    TileAtlas, so rendering is just one Surface.blits call of areas of
+    the atlas with no per tile copies.
+    Each section of a chunk gets its own surface, so the sky and the
+    solid depths don't take up memory or blits.
+    """
+
+    def __init__(self, atlas):
+        self.atlas = atlas.surf
+        self.rects = atlas.rects  # indexed by texture * LIGHT_LEVELS + level
+        self.textures = np.array(TEXTURE, dtype=np.intp)  # by tile id
+        # pixel position of every tile in a section,
+        # in the same order as tiledata.ravel()
+        self.positions = [(x*BLOCK_PIXEL_SIZE, y*BLOCK_PIXEL_SIZE)
+                          for y in range(SECTION_HEIGHT)
+                          for x in range(CHUNK_WIDTH)]
+        # air in full light looks the same as the sky the chunk is filled with
+        air = TEXTURE[TILES.AIR.value]
+        self.skip_key = air*LIGHT_LEVELS + LIGHT_LEVELS-1
+        # and every tile looks the same in the dark, so the dark depths
+        # all use this key and end up as uniform sections
+        self.dark_key = air*LIGHT_LEVELS
+        self.uniform = {}  # key: section surface that is only that tile
+
+    def tile_keys(self, tiledata, lightdata):
+        # one row of keys per section
+        keys = self.textures[tiledata]*LIGHT_LEVELS + lightdata
+        keys[lightdata == 0] = self.dark_key
+        return keys.reshape(-1, SECTION_HEIGHT*CHUNK_WIDTH)
+
+    def section_keys(self, tiledata, lightdata, s):
+        rows = slice(s*SECTION_HEIGHT, (s+1)*SECTION_HEIGHT)
+        return self.tile_keys(tiledata[rows], lightdata[rows])[0]
+
+    def render(self, tiledata, lightdata):
+        image = ChunkImage()
+        keys = self.tile_keys(tiledata, lightdata)
+        for s in range(SECTIONS):
+            self.render_section(image, s, keys[s])
+        return image
+
+    def render_section(self, image, s, keys):
+        first = keys[0]
+        if (keys == first).all():
+            if first == self.skip_key:
+                image.sections[s] = None
+                image.shared.discard(s)
+            else:
+                image.sections[s] = self.uniform_section(int(first))
+                image.shared.add(s)
+            return
+
+        section_surf = surface.Surface(SECTION_SIZE)
+        section_surf.fill(SKY_COLOR)
+        visible = np.flatnonzero(keys != self.skip_key)
+        atlas = self.atlas
+        rects = self.rects
+        positions = self.positions
+        section_surf.blits([(atlas, positions[i], rects[k]) for k, i in
+                            zip(keys[visible].tolist(), visible.tolist())],
+                           doreturn=False)
+        image.sections[s] = section_surf
+        image.shared.discard(s)
+
+    def uniform_section(self, key):
+        section_surf = self.uniform.get(key)
+        if section_surf is None:
+            section_surf = surface.Surface(SECTION_SIZE)
+            area = self.rects[key]
+            section_surf.blits([(self.atlas, pos, area)
+                                for pos in self.positions], doreturn=False)
+            self.uniform[key] = section_surf
+        return section_surf
+
+    def render_tiles(self, image, tiledata, lightdata, cells):
+        # redraws only the given (x, y) tiles on an already rendered image
+        by_section = {}
+        for x, y in cells:
+            by_section.setdefault(y // SECTION_HEIGHT, []).append((x, y))
+
+        for s, section_cells in by_section.items():
+            section_surf = image.sections[s]
+            if section_surf is None or s in image.shared:
+                # nothing of its own to draw on, render the whole section
+                self.render_section(image, s, self.section_keys(
+                    tiledata, lightdata, s))
+                continue
+
+            blits = []
+            for x, y in section_cells:
+                key = (TEXTURE[tiledata[y, x]]*LIGHT_LEVELS +
+                       int(lightdata[y, x]))
+                pos = (x*BLOCK_PIXEL_SIZE,
+                       (y - s*SECTION_HEIGHT)*BLOCK_PIXEL_SIZE)
+                if key == self.skip_key:
+                    section_surf.fill(SKY_COLOR, (pos, (BLOCK_PIXEL_SIZE,
+                                                        BLOCK_PIXEL_SIZE)))
+                else:
+                    blits.append((self.atlas, pos, self.rects[key]))
+            section_surf.blits(blits, doreturn=False)
+
+    def draw_border(self, surf, x, top, bottom):
+        # line on the left edge of a chunk, drawn on the screen so the
+        # sections don't need their own copy of it
+        draw.line(surf, (0, 25, 255), (x, top), (x, bottom), 2)
@@ -0,0 +1,93 @@
+import threading
+import time
+import traceback
+from settings import CHUNK_WRITE_DELAY
+from scripts.profiler import profiler
+from scripts.region import RegionError
+
+
+class ChunkWriter:
+    """
+    Writes chunks to the region files on a background thread.
+    Queued chunks are kept by chunkpos so writing the same chunk
+    twice before the thread gets to it only writes it once, and the
+    thread waits CHUNK_WRITE_DELAY seconds after waking up so chunks
+    unloaded together end up in one write per region.
+    """
+
+    def __init__(self, storage, delay=CHUNK_WRITE_DELAY):
+        self.storage = storage
+        self.delay = delay
+        self.pending = {}  # chunkpos: snapshot of the chunk
+        self.writing = {}  # the batch the thread is saving right now
+        self.cond = threading.Condition()
+        self.running = True
+        self.flushing = 0  # threads waiting in flush()
+        self.writes = 0  # chunks written, for the debug screen
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def queue(self, chunk):
+        with self.cond:
+            self.pending[chunk.chunkpos] = chunk.snapshot()
+            self.cond.notify_all()
+
+    def get(self, chunkpos):
+        # a chunk that is waiting to be written is newer than the file
+        with self.cond:
+            chunk = self.pending.get(chunkpos) or self.writing.get(chunkpos)
+            return chunk.snapshot() if chunk is not None else None
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or not self.running)
+                if not self.pending:
+                    return
+                # let more chunks pile up, unless someone is waiting for us
+                self.cond.wait_for(
+                    lambda: self.flushing or not self.running, self.delay)
+                self.writing, self.pending = self.pending, {}
+            try:
+                with profiler.span("save"):
+                    self.storage.save_chunks(list(self.writing.values()))
+                self.writes += len(self.writing)
+            except (OSError, RegionError) as e:
+                print(f"Couldn't save chunks {list(self.writing)}: {e}")
+            except Exception:
+                # anything else is a bug, but the thread has to keep
+                # going or flush() waits forever and nothing is saved
+                print(f"Couldn't save chunks {list(self.writing)}:")
+                traceback.print_exc()
+            finally:
+                with self.cond:
+                    self.writing = {}
+                    self.cond.notify_all()
+
+    def flush(self, timeout=None):
+        # returns False if the chunks couldn't be written in time
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            self.flushing += 1
+            self.cond.notify_all()
+            try:
+                while self.pending or self.writing:
+                    remaining = (None if end is None
+                                 else end - time.monotonic())
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.cond.wait(remaining)
+            finally:
+                self.flushing -= 1
+        return True
+
+    def clear(self):
+        with self.cond:
+            self.pending = {}
+
+    def stop(self, timeout=None):
+        done = self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        return done
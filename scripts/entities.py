@@ -0,0 +1,131 @@
+from settings import CHUNK_WIDTH, BLOCK_PIXEL_SIZE, JUMP_SPEED
+from scripts.physics import Body
+
+CHUNK_PIXELS = CHUNK_WIDTH*BLOCK_PIXEL_SIZE
+# kind: (width, height, walking speed in pixels per second)
+KINDS = {
+    "mob": (12, 16, 60),
+}
+
+
+def chunk_of(x):
+    return int(x // CHUNK_PIXELS)
+
+
+class Entity(Body):
+    __slots__ = ("id", "kind", "chunkpos", "direction", "prev_x", "prev_y")
+
+    def __init__(self, entity_id, kind, x, y):
+        w, h, _ = KINDS[kind]
+        super().__init__(x, y, w, h)
+        self.id = entity_id
+        self.kind = kind
+        self.chunkpos = chunk_of(x)  # the bucket it's in
+        self.direction = 1
+        self.prev_x = x  # before the last tick, for drawing in between
+        self.prev_y = y
+
+    def to_json(self):
+        return {"kind": self.kind, "x": self.x, "y": self.y,
+                "vx": self.vx, "vy": self.vy, "direction": self.direction}
+
+    def __repr__(self):
+        return "Entity({}, {}, {}, {})".format(self.id, self.kind,
+                                               self.x, self.y)
+
+
+class EntityManager:
+    """
+    Every entity in the loaded chunks, hashed by the chunk they're in
+    so finding the ones near something only looks at a few chunks.
+
+    Entities belong to their chunk: when a chunk is unloaded its
+    entities are turned into its entitydata and stop existing until
+    it's loaded again, so nothing outside of the loaded chunks is ever
+    simulated. Chunks that aren't loaded count as solid for the
+    collider, so an entity can't walk into one either.
+    Only used from the main thread.
+    """
+
+    def __init__(self, collider):
+        self.collider = collider
+        self.entities = {}  # id: Entity
+        self.by_chunk = {}  # chunkpos: {id: Entity}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.entities)
+
+    def spawn(self, kind, x, y):
+        entity = Entity(self.next_id, kind, x, y)
+        self.next_id += 1
+        self.entities[entity.id] = entity
+        self.by_chunk.setdefault(entity.chunkpos, {})[entity.id] = entity
+        return entity
+
+    def load_chunk(self, entitydata):
+        for data in entitydata:
+            entity = self.spawn(data["kind"], data["x"], data["y"])
+            entity.vx = data.get("vx", 0.0)
+            entity.vy = data.get("vy", 0.0)
+            entity.direction = data.get("direction", 1)
+
+    def unload_chunk(self, chunkpos):
+        # removes the chunk's entities and returns them as entitydata
+        bucket = self.by_chunk.pop(chunkpos, {})
+        for entity_id in bucket:
+            del self.entities[entity_id]
+        return [entity.to_json() for entity in bucket.values()]
+
+    def clear(self):
+        self.entities = {}
+        self.by_chunk = {}
+
+    def in_chunks(self, first, last):
+        # entities in chunks first to last
+        for chunkpos in range(first, last + 1):
+            bucket = self.by_chunk.get(chunkpos)
+            if bucket:
+                yield from bucket.values()
+
+    def near(self, x, y, radius):
+        radius_sq = radius*radius
+        return [entity for entity in self.in_chunks(chunk_of(x - radius),
+                                                    chunk_of(x + radius))
+                if (entity.x - x)**2 + (entity.y - y)**2 <= radius_sq]
+
+    def draw(self, surf, view, sprites, alpha=1.0):
+        # view is the camera rect, only the chunks on screen are looked
+        # at. alpha is how far into the next tick it is, like the player
+        for entity in self.in_chunks(chunk_of(view.left) - 1,
+                                     chunk_of(view.right)):
+            x = entity.prev_x + (entity.x - entity.prev_x)*alpha
+            y = entity.prev_y + (entity.y - entity.prev_y)*alpha
+            surf.blit(sprites[entity.kind], (x - view.left, y - view.top))
+
+    def tick(self, dt):
+        # dt in seconds
+        moved = []
+        for entity in self.entities.values():
+            entity.prev_x = entity.x
+            entity.prev_y = entity.y
+            self.collider.step(entity, dt)
+            self.think(entity)
+            if chunk_of(entity.x) != entity.chunkpos:
+                moved.append(entity)
+        for entity in moved:
+            del self.by_chunk[entity.chunkpos][entity.id]
+            if not self.by_chunk[entity.chunkpos]:
+                del self.by_chunk[entity.chunkpos]
+            entity.chunkpos = chunk_of(entity.x)
+            self.by_chunk.setdefault(entity.chunkpos, {})[entity.id] = entity
+
+    def think(self, entity):
+        # after it moved: walks until something's in the way, jumps at
+        # it and turns around if that didn't get it over
+        if entity.vx and entity.x == entity.prev_x:
+            if entity.on_ground:
+                entity.vy = -JUMP_SPEED
+            elif entity.vy >= 0:
+                entity.direction = -entity.direction
+        entity.vx = entity.direction*KINDS[entity.kind][2]
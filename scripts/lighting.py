@@ -0,0 +1,255 @@
+from collections import deque
+import threading
+import numpy as np
+from settings import CHUNK_WIDTH, CHUNK_HEIGHT, LIGHT_LEVELS
+from scripts.tiles import TRANSPARENT, LIGHT_OPACITY, LIGHT_EMISSION
+from scripts.chunk import Chunk, LIGHT_DTYPE
+
+MAX_LIGHT = LIGHT_LEVELS - 1
+
+
+class LightEngine:
+    """
+    Sky and block light in one channel, 15 is full light.
+    Sky light goes straight down from the top of the world until it
+    hits a tile that isn't see-through, from there on (and from
+    glowing tiles) it spreads with a breadth first flood fill that
+    loses LIGHT_OPACITY of the tile it goes into every step.
+
+    Works in world tile coordinates over every loaded chunk, so light
+    goes across chunk borders. While an update runs the chunk arrays
+    it touches are turned into flat lists (a lot faster to index from
+    python than numpy) and written back at the end.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks  # chunkpos: Chunk, usually loaded_chunks
+        self.lock = threading.Lock()
+        self.work = {}  # chunkpos: (tiles, light) lists for this update
+        self.original = {}  # (chunkpos, index): light before this update
+        self.skytops = {}  # (chunkpos, x): first row sky light can't pass
+
+    def begin(self):
+        self.work = {}
+        self.original = {}
+        self.skytops = {}
+
+    def finish(self):
+        # writes the lists back and returns {chunkpos: {(x, y)}} of
+        # every tile whose light level is different now
+        changed = {}
+        for (chunkpos, i), old in self.original.items():
+            light = self.work[chunkpos][1]
+            if light[i] != old:
+                changed.setdefault(chunkpos, set()).add(
+                    (i % CHUNK_WIDTH, i // CHUNK_WIDTH))
+        for chunkpos in changed:
+            chunk = self.chunks.get(chunkpos)
+            if chunk is not None:
+                chunk.lightdata = np.array(
+                    self.work[chunkpos][1], dtype=LIGHT_DTYPE).reshape(
+                        CHUNK_HEIGHT, CHUNK_WIDTH)
+        self.begin()
+        return changed
+
+    def arrays(self, chunkpos):
+        arrays = self.work.get(chunkpos)
+        if arrays is None:
+            chunk = self.chunks.get(chunkpos)
+            if chunk is None:
+                return None
+            arrays = (chunk.tiledata.ravel().tolist(),
+                      chunk.lightdata.ravel().tolist())
+            self.work[chunkpos] = arrays
+        return arrays
+
+    def set_light(self, chunkpos, light, i, value):
+        key = (chunkpos, i)
+        if key not in self.original:
+            self.original[key] = light[i]
+        light[i] = value
+
+    def skytop(self, chunkpos, tiles, x):
+        top = self.skytops.get((chunkpos, x))
+        if top is None:
+            top = CHUNK_HEIGHT
+            for y in range(CHUNK_HEIGHT):
+                if not TRANSPARENT[tiles[y*CHUNK_WIDTH + x]]:
+                    top = y
+                    break
+            self.skytops[(chunkpos, x)] = top
+        return top
+
+    def source(self, chunkpos, tiles, i):
+        x, y = i % CHUNK_WIDTH, i // CHUNK_WIDTH
+        if y < self.skytop(chunkpos, tiles, x):
+            return MAX_LIGHT
+        return LIGHT_EMISSION[tiles[i]]
+
+    def neighbours(self, chunkpos, i):
+        # (chunkpos, index) of the 4 neighbours that are in loaded chunks
+        x, y = i % CHUNK_WIDTH, i // CHUNK_WIDTH
+        if y > 0:
+            yield chunkpos, i - CHUNK_WIDTH
+        if y < CHUNK_HEIGHT-1:
+            yield chunkpos, i + CHUNK_WIDTH
+        if x > 0:
+            yield chunkpos, i - 1
+        elif self.arrays(chunkpos-1) is not None:
+            yield chunkpos-1, i + CHUNK_WIDTH-1
+        if x < CHUNK_WIDTH-1:
+            yield chunkpos, i + 1
+        elif self.arrays(chunkpos+1) is not None:
+            yield chunkpos+1, i - (CHUNK_WIDTH-1)
+
+    def propagate(self, queue):
+        # queue has (chunkpos, index) of tiles that got brighter
+        opacity = LIGHT_OPACITY
+        while queue:
+            chunkpos, i = queue.popleft()
+            level = self.work[chunkpos][1][i]
+            for nchunk, n in self.neighbours(chunkpos, i):
+                tiles, light = self.work[nchunk]
+                new_level = level - opacity[tiles[n]]
+                if new_level > light[n]:
+                    self.set_light(nchunk, light, n, new_level)
+                    queue.append((nchunk, n))
+
+    def remove(self, queue):
+        # queue has (chunkpos, index, old level) of tiles set to 0,
+        # everything that could have been lit by them is turned off too,
+        # returns the tiles that have to be spread again
+        relight = deque()
+        darkened = []
+        while queue:
+            chunkpos, i, level = queue.popleft()
+            darkened.append((chunkpos, i))
+            for nchunk, n in self.neighbours(chunkpos, i):
+                light = self.work[nchunk][1]
+                nlevel = light[n]
+                if nlevel and nlevel < level:
+                    self.set_light(nchunk, light, n, 0)
+                    queue.append((nchunk, n, nlevel))
+                elif nlevel >= level:
+                    relight.append((nchunk, n))
+        # light sources that got turned off light themselves up again
+        for chunkpos, i in darkened:
+            tiles, light = self.work[chunkpos]
+            source = self.source(chunkpos, tiles, i)
+            if source > light[i]:
+                self.set_light(chunkpos, light, i, source)
+                relight.append((chunkpos, i))
+        return relight
+
+    def light_chunk(self, chunkpos):
+        # full light of a chunk on its own, ignores the neighbours
+        with self.lock:
+            self.begin()
+            tiles, light = self.arrays(chunkpos)
+            queue = deque()
+            for i in range(CHUNK_WIDTH*CHUNK_HEIGHT):
+                self.set_light(chunkpos, light, i, 0)
+            for i in range(CHUNK_WIDTH*CHUNK_HEIGHT):
+                source = self.source(chunkpos, tiles, i)
+                if source:
+                    light[i] = source
+                    queue.append((chunkpos, i))
+            self.propagate_alone(queue, chunkpos)
+            return self.finish()
+
+    def propagate_alone(self, queue, chunkpos):
+        # same as propagate but never leaves the chunk
+        tiles, light = self.work[chunkpos]
+        opacity = LIGHT_OPACITY
+        while queue:
+            _, i = queue.popleft()
+            level = light[i]
+            x, y = i % CHUNK_WIDTH, i // CHUNK_WIDTH
+            for n, ok in ((i - CHUNK_WIDTH, y > 0),
+                          (i + CHUNK_WIDTH, y < CHUNK_HEIGHT-1),
+                          (i - 1, x > 0),
+                          (i + 1, x < CHUNK_WIDTH-1)):
+                if ok:
+                    new_level = level - opacity[tiles[n]]
+                    if new_level > light[n]:
+                        light[n] = new_level
+                        queue.append((chunkpos, n))
+
+    def add_chunk(self, chunkpos):
+        # call when a chunk was just loaded. The light it comes with from
+        # the cache or a region file can't be trusted, a neighbour could
+        # have changed while it was away, so its own light is worked out
+        # again from its tiles. The light on the neighbours' side of both
+        # borders is taken out and spread again, that clears anything
+        # they still had from the old light, then light goes over the
+        # borders in both directions
+        with self.lock:
+            self.begin()
+            arrays = self.arrays(chunkpos)
+            if arrays is None:
+                return {}
+            tiles, light = arrays
+            queue = deque()
+            for i in range(CHUNK_WIDTH*CHUNK_HEIGHT):
+                source = self.source(chunkpos, tiles, i)
+                self.set_light(chunkpos, light, i, source)
+                if source:
+                    queue.append((chunkpos, i))
+            self.propagate_alone(queue, chunkpos)
+
+            removed = deque()
+            for side, other_x in ((-1, CHUNK_WIDTH-1), (1, 0)):
+                neighbour = self.arrays(chunkpos + side)
+                if neighbour is None:
+                    continue
+                other_light = neighbour[1]
+                for y in range(CHUNK_HEIGHT):
+                    j = y*CHUNK_WIDTH + other_x
+                    if other_light[j]:
+                        removed.append((chunkpos + side, j, other_light[j]))
+                        self.set_light(chunkpos + side, other_light, j, 0)
+            relight = self.remove(removed)
+            for edge_x in (0, CHUNK_WIDTH-1):
+                for y in range(CHUNK_HEIGHT):
+                    relight.append((chunkpos, y*CHUNK_WIDTH + edge_x))
+            self.propagate(relight)
+            return self.finish()
+
+    def update_block(self, wx, y, old_tile):
+        # call after the tile at world position (wx, y) was changed
+        # from old_tile, returns the tiles whose light changed
+        chunkpos, x = divmod(wx, CHUNK_WIDTH)
+        with self.lock:
+            self.begin()
+            arrays = self.arrays(chunkpos)
+            if arrays is None:
+                return {}
+            tiles, light = arrays
+            i = y*CHUNK_WIDTH + x
+
+            new_top = self.skytop(chunkpos, tiles, x)
+            new_tile = tiles[i]
+            tiles[i] = old_tile
+            self.skytops.pop((chunkpos, x))
+            old_top = self.skytop(chunkpos, tiles, x)
+            tiles[i] = new_tile
+            self.skytops[(chunkpos, x)] = new_top
+
+            # the edited tile and the part of the column that got or
+            # lost sky light are turned off and spread again
+            rows = {y} | set(range(min(old_top, new_top),
+                                   max(old_top, new_top)))
+            queue = deque()
+            for row in rows:
+                j = row*CHUNK_WIDTH + x
+                queue.append((chunkpos, j, light[j]))
+                self.set_light(chunkpos, light, j, 0)
+            self.propagate(self.remove(queue))
+            return self.finish()
+
+
+def compute_chunk_light(tiledata):
+    # light of a single chunk without neighbours, used by the generator
+    engine = LightEngine({0: Chunk(0, tiledata)})
+    engine.light_chunk(0)
+    return engine.chunks[0].lightdata
@@ -0,0 +1,50 @@
+"""
+Converts a world saved with one json file per chunk into region files.
+
+    python -m scripts.migrate_world [world_dir] [--keep]
+
+The old .chunk files are removed afterwards unless --keep is given and
+the generated chunk list in info.json is cleaned up on the way.
+"""
+import json
+import os
+import sys
+from scripts.chunk import Chunk
+from scripts.region import RegionStorage
+from scripts.chunk_index import GeneratedChunks
+
+
+def migrate(world_path="world", keep_old=False):
+    chunk_path = os.path.join(world_path, "chunks")
+    storage = RegionStorage(chunk_path)
+
+    chunks = []
+    oldfiles = []
+    for f in os.listdir(chunk_path):
+        if not f.endswith(".chunk"):
+            continue
+        with open(os.path.join(chunk_path, f), "r") as chunkfile:
+            chunkpos = int(f[:-len(".chunk")])
+            chunks.append(Chunk.from_json(chunkpos, json.load(chunkfile)))
+        oldfiles.append(f)
+    storage.save_chunks(chunks)
+    print(f"Moved {len(chunks)} chunks into region files")
+
+    info_path = os.path.join(world_path, "info.json")
+    with open(info_path, "r") as f:
+        map_data = json.load(f)
+    # older saves added the same chunk again every time it was loaded
+    map_data["generated_chunks"] = GeneratedChunks.from_json(
+        map_data["generated_chunks"]).to_json()
+    with open(info_path, "w") as f:
+        json.dump(map_data, f)
+
+    if not keep_old:
+        for f in oldfiles:
+            os.remove(os.path.join(chunk_path, f))
+    return len(chunks)
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    migrate(args[0] if args else "world", "--keep" in sys.argv)
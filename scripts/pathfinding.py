@@ -0,0 +1,239 @@
+from collections import deque
+import heapq
+import time
+from settings import (CHUNK_WIDTH, CHUNK_HEIGHT, BLOCK_PIXEL_SIZE,
+                      GRAVITY, JUMP_SPEED,
+                      PATH_BUDGET, PATH_MAX_NODES, PATH_CACHE_SIZE)
+from scripts.physics import ALL_ROWS, row_mask
+
+BOTTOM_ROW = 1 << (CHUNK_HEIGHT-1)
+# whole blocks a jump gets over
+JUMP_BLOCKS = int(JUMP_SPEED**2 / (2*GRAVITY) // BLOCK_PIXEL_SIZE)
+SLICE = 64  # tiles a search looks at between checking the time
+
+
+def standing_masks(solid_masks):
+    # bit y is set where a tile is free and the one under it is solid,
+    # under the world counts as solid
+    return [~solid & ((solid >> 1) | BOTTOM_ROW) & ALL_ROWS
+            for solid in solid_masks]
+
+
+def cell_at(x, y):
+    # the tile a pixel position is in
+    return int(x // BLOCK_PIXEL_SIZE), int(y // BLOCK_PIXEL_SIZE)
+
+
+class PathRequest:
+    __slots__ = ("start", "goal", "search", "chunks", "path", "done")
+
+    def __init__(self, start, goal):
+        self.start = start
+        self.goal = goal
+        self.search = None
+        self.chunks = None  # (first, last) chunk the search read so far
+        self.path = None  # list of (col, row) tiles, None if there's none
+        self.done = False
+
+
+class Pathfinder:
+    """
+    A* over the tiles something one tile big can stand on: walking to
+    the next column, jumping up JUMP_BLOCKS or dropping down any height.
+    Paths go across chunk borders, chunks that aren't loaded are solid
+    to it like they are to the collider.
+
+    Every chunk gets a walkability grid, one bitmask of standing tiles
+    per column made from the collider's solid masks, and found paths
+    are cached. invalidate() throws away the grid of a chunk and every
+    cached path that looked at it, TileManager calls it when a chunk is
+    edited, loaded or unloaded.
+
+    find_path() searches right away, request() queues a search that
+    update() carries on with every frame for up to PATH_BUDGET seconds,
+    like new chunks are rendered. It isn't a thread since the search
+    reads the live chunks and would only fight the render loop for the
+    GIL anyway.
+    """
+
+    def __init__(self, collider, jump=JUMP_BLOCKS, max_nodes=PATH_MAX_NODES,
+                 cache_size=PATH_CACHE_SIZE):
+        self.collider = collider
+        self.jump = jump
+        self.max_nodes = max_nodes
+        self.cache_size = cache_size
+        self.grids = {}  # chunkpos: (solid masks, standing masks)
+        self.paths = {}  # (start, goal): (path, first chunk, last chunk)
+        self.requests = deque()
+
+    def invalidate(self, chunkpos):
+        self.grids.pop(chunkpos, None)
+        self.paths = {key: cached for key, cached in self.paths.items()
+                      if not cached[1] <= chunkpos <= cached[2]}
+        for request in self.requests:
+            if request.chunks is not None and \
+                    request.chunks[0] <= chunkpos <= request.chunks[1]:
+                # start over with the new tiles
+                request.search = None
+                request.chunks = None
+
+    def clear(self):
+        self.grids = {}
+        self.paths = {}
+        self.requests.clear()
+
+    def grid(self, chunkpos):
+        grid = self.grids.get(chunkpos)
+        if grid is None:
+            solid = self.collider.chunk_masks(chunkpos)
+            if solid is None:
+                return None
+            grid = (solid, standing_masks(solid))
+            self.grids[chunkpos] = grid
+        return grid
+
+    def column(self, col):
+        # (solid, standing) masks of a world column
+        chunkpos, x = divmod(col, CHUNK_WIDTH)
+        grid = self.grid(chunkpos)
+        if grid is None:
+            return ALL_ROWS, 0
+        return grid[0][x], grid[1][x]
+
+    def ground(self, col, row):
+        # the first tile at or under (col, row) that can be stood on
+        solid, standing = self.column(col)
+        below = standing >> max(row, 0) << max(row, 0)
+        if not below:
+            return None
+        return col, (below & -below).bit_length() - 1
+
+    def ground_at(self, x, y):
+        # the standing tile at or under a pixel position
+        return self.ground(*cell_at(x, y))
+
+    def neighbours(self, cell):
+        col, row = cell
+        bit = 1 << row
+        solid_here = self.column(col)[0]
+        for c in (col - 1, col + 1):
+            solid, standing = self.column(c)
+            if standing & bit:
+                yield (c, row), 1
+            elif not solid & bit:
+                # nothing under it, falls until it lands on something
+                under = solid >> (row + 1) << (row + 1)
+                land = ((under & -under).bit_length() - 2 if under
+                        else CHUNK_HEIGHT - 1)
+                yield (c, land), 1 + (land - row)*0.5
+            else:
+                # a ledge, the first free tile above is the top of it
+                free = ~solid & (bit - 1)
+                if not free:
+                    continue
+                top = free.bit_length() - 1
+                up = row - top
+                if up <= self.jump and \
+                        not solid_here & row_mask(top, row - 1):
+                    yield (c, top), 1 + up
+
+    def search(self, start, goal):
+        # A* as a generator so it can be stopped and carried on, yields
+        # (first chunk, last chunk) it read so far every SLICE tiles
+        # and returns the path (or None)
+        if not self.column(start[0])[1] >> start[1] & 1 or \
+                not self.column(goal[0])[1] >> goal[1] & 1:
+            return None
+        goal_col = goal[0]
+        # columns looked at, the neighbours of each are read too
+        low = min(start[0], goal_col)
+        high = max(start[0], goal_col)
+        costs = {start: 0}
+        came_from = {start: None}
+        heap = [(abs(goal_col - start[0]), 0, start)]
+        expanded = 0
+        path = None
+        while heap:
+            _, cost, cell = heapq.heappop(heap)
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                path.reverse()
+                break
+            if cost > costs[cell]:
+                continue  # already got here a cheaper way
+            expanded += 1
+            if expanded > self.max_nodes:
+                break
+            col = cell[0]
+            if col < low:
+                low = col
+            elif col > high:
+                high = col
+            if expanded % SLICE == 0:
+                yield (low - 1) // CHUNK_WIDTH, (high + 1) // CHUNK_WIDTH
+            for nxt, step in self.neighbours(cell):
+                new_cost = cost + step
+                if new_cost < costs.get(nxt, new_cost + 1):
+                    costs[nxt] = new_cost
+                    came_from[nxt] = cell
+                    heapq.heappush(heap, (new_cost + abs(goal_col - nxt[0]),
+                                          new_cost, nxt))
+        # the neighbours of every tile it looked at were read too
+        cols = [c for c, _ in costs]
+        self.cache(start, goal, path, (min(cols) - 1) // CHUNK_WIDTH,
+                   (max(cols) + 1) // CHUNK_WIDTH)
+        return path
+
+    def cache(self, start, goal, path, first_chunk, last_chunk):
+        if len(self.paths) >= self.cache_size:
+            del self.paths[next(iter(self.paths))]  # the oldest one
+        self.paths[(start, goal)] = (path, first_chunk, last_chunk)
+
+    def cached(self, start, goal):
+        # (True, path) if the path between them is known
+        cached = self.paths.get((start, goal))
+        if cached is None:
+            return False, None
+        return True, cached[0]
+
+    def find_path(self, start, goal):
+        found, path = self.cached(start, goal)
+        if found:
+            return path
+        search = self.search(start, goal)
+        while True:
+            try:
+                next(search)
+            except StopIteration as done:
+                return done.value
+
+    def request(self, start, goal):
+        request = PathRequest(start, goal)
+        found, request.path = self.cached(start, goal)
+        request.done = found
+        if not found:
+            self.requests.append(request)
+        return request
+
+    def update(self, budget=PATH_BUDGET):
+        end = time.perf_counter() + budget
+        while self.requests and time.perf_counter() < end:
+            request = self.requests[0]
+            if request.search is None:
+                found, request.path = self.cached(request.start,
+                                                  request.goal)
+                if found:
+                    request.done = True
+                    self.requests.popleft()
+                    continue
+                request.search = self.search(request.start, request.goal)
+            try:
+                while time.perf_counter() < end:
+                    request.chunks = next(request.search)
+            except StopIteration as done:
+                request.path = done.value
+                request.done = True
+                self.requests.popleft()
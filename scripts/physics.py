@@ -0,0 +1,177 @@
+import math
+import numpy as np
+from settings import (CHUNK_WIDTH, CHUNK_HEIGHT, BLOCK_PIXEL_SIZE,
+                      GRAVITY, MAX_FALL_SPEED, STEP_HEIGHT)
+from scripts.tiles import SOLID
+
+SOLID_TILES = np.array(SOLID)  # for looking up a whole chunk at once
+ALL_ROWS = (1 << CHUNK_HEIGHT) - 1
+
+
+def column_masks(tiledata):
+    # an int per column of the chunk with bit y set if tile y is solid
+    solid = SOLID_TILES[tiledata]
+    return [int.from_bytes(np.packbits(solid[:, x], bitorder="little")
+                           .tobytes(), "little")
+            for x in range(CHUNK_WIDTH)]
+
+
+def row_mask(first, last):
+    # bits of the rows first to last, the ones outside the world left out
+    first = max(first, 0)
+    last = min(last, CHUNK_HEIGHT-1)
+    if first > last:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+class Body:
+    # a box in world pixels, x and y are the top left corner
+    __slots__ = ("x", "y", "w", "h", "vx", "vy", "on_ground")
+
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.vx = 0.0  # pixels per second
+        self.vy = 0.0
+        self.on_ground = False
+
+    def __repr__(self):
+        return "Body({}, {}, {}, {})".format(self.x, self.y, self.w, self.h)
+
+
+class TileCollider:
+    """
+    Moves boxes through the tiles of the loaded chunks.
+    Each axis is swept on its own and only the tile columns (or rows)
+    the box goes into on the way are looked at, so the cost depends
+    on how far the box moves and how big it is, not on how many chunks
+    are loaded. Crossing into another chunk is just the next column.
+
+    Tiles are read straight from the chunk arrays into one bitmask of
+    solid tiles per column, made the first time a chunk is needed and
+    thrown away by invalidate() when it's edited. Chunks that aren't
+    loaded count as solid and so does everything below the world, so
+    nothing falls out of it while the chunks under it are loading.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks  # chunkpos: Chunk, usually loaded_chunks
+        self.masks = {}  # chunkpos: (chunk, column masks)
+
+    def invalidate(self, chunkpos):
+        self.masks.pop(chunkpos, None)
+
+    def clear(self):
+        self.masks = {}
+
+    def chunk_masks(self, chunkpos):
+        # the column masks of a loaded chunk, None if it isn't loaded
+        chunk = self.chunks.get(chunkpos)
+        if chunk is None:
+            return None
+        cached = self.masks.get(chunkpos)
+        if cached is None or cached[0] is not chunk:
+            cached = (chunk, column_masks(chunk.tiledata))
+            self.masks[chunkpos] = cached
+        return cached[1]
+
+    def column(self, col):
+        # solid rows of a world tile column
+        chunkpos, x = divmod(col, CHUNK_WIDTH)
+        masks = self.chunk_masks(chunkpos)
+        return ALL_ROWS if masks is None else masks[x]
+
+    def sweep_x(self, body, dx):
+        # moves the body dx pixels or up to the first solid column in
+        # the way, returns True if it hit one
+        if not dx:
+            return False
+        rows = row_mask(math.floor(body.y / BLOCK_PIXEL_SIZE),
+                        math.ceil((body.y + body.h) / BLOCK_PIXEL_SIZE) - 1)
+        if dx > 0:
+            edge = body.x + body.w
+            for col in range(math.ceil(edge / BLOCK_PIXEL_SIZE),
+                             math.ceil((edge + dx) / BLOCK_PIXEL_SIZE)):
+                if self.column(col) & rows:
+                    body.x = col*BLOCK_PIXEL_SIZE - body.w
+                    return True
+        else:
+            for col in range(math.floor(body.x / BLOCK_PIXEL_SIZE) - 1,
+                             math.floor((body.x + dx) / BLOCK_PIXEL_SIZE) - 1,
+                             -1):
+                if self.column(col) & rows:
+                    body.x = (col+1)*BLOCK_PIXEL_SIZE
+                    return True
+        body.x += dx
+        return False
+
+    def sweep_y(self, body, dy):
+        # same as sweep_x but up and down, the first solid row is found
+        # for every column the body is in at once from the masks
+        if not dy:
+            return False
+        cols = range(math.floor(body.x / BLOCK_PIXEL_SIZE),
+                     math.ceil((body.x + body.w) / BLOCK_PIXEL_SIZE))
+        if dy > 0:
+            edge = body.y + body.h
+            first = math.ceil(edge / BLOCK_PIXEL_SIZE)
+            last = math.ceil((edge + dy) / BLOCK_PIXEL_SIZE) - 1
+            rows = row_mask(first, last)
+            hit = CHUNK_HEIGHT if last >= CHUNK_HEIGHT else None
+            for col in cols:
+                solid = self.column(col) & rows
+                if solid:
+                    row = (solid & -solid).bit_length() - 1  # lowest bit
+                    if hit is None or row < hit:
+                        hit = row
+            if hit is not None and hit >= first:
+                body.y = hit*BLOCK_PIXEL_SIZE - body.h
+                return True
+        else:
+            first = math.floor(body.y / BLOCK_PIXEL_SIZE) - 1
+            last = math.floor((body.y + dy) / BLOCK_PIXEL_SIZE)
+            rows = row_mask(last, first)
+            hit = None
+            for col in cols:
+                solid = self.column(col) & rows
+                if solid:
+                    row = solid.bit_length() - 1  # highest bit
+                    if hit is None or row > hit:
+                        hit = row
+            if hit is not None:
+                body.y = (hit+1)*BLOCK_PIXEL_SIZE
+                return True
+        body.y += dy
+        return False
+
+    def move(self, body, dx, dy, step_height=STEP_HEIGHT):
+        # moves the body by (dx, dy), sideways first. Something on the
+        # ground that walks into a ledge up to step_height high goes
+        # up on it instead of stopping
+        start_x = body.x
+        if self.sweep_x(body, dx) and body.on_ground and step_height:
+            self.step_up(body, dx - (body.x - start_x), step_height)
+
+        if self.sweep_y(body, dy):
+            body.on_ground = dy > 0
+            body.vy = 0.0
+        else:
+            body.on_ground = False
+
+    def step_up(self, body, dx, step_height):
+        x, y = body.x, body.y
+        if not self.sweep_y(body, -step_height):
+            if not self.sweep_x(body, dx) or body.x != x:
+                # and back down onto whatever it stepped on
+                self.sweep_y(body, step_height)
+                return True
+        body.x, body.y = x, y
+        return False
+
+    def step(self, body, dt):
+        # one tick of gravity and movement, dt in seconds
+        body.vy = min(body.vy + GRAVITY*dt, MAX_FALL_SPEED)
+        self.move(body, body.vx*dt, body.vy*dt)
@@ -1,11 +1,10 @@
-from pygame import (key, rect, K_w, K_UP, K_a, K_LEFT,
-                    K_s, K_DOWN, K_d, K_RIGHT, mouse)
+from pygame import (key, rect, K_w, K_UP, K_SPACE, K_a, K_LEFT,
+                    K_d, K_RIGHT, mouse)
 from scripts.object import Object
+from scripts.physics import Body
 from settings import (CHUNK_WIDTH, CHUNK_HEIGHT,
-                      CAMERA_OFFSET, PLAYER_SPEED, BLOCK_PIXEL_SIZE)
-from scripts.tiles import TILES
-
-# TODO: I NEED TO MAKE COLLISION AND GRAVITY (LOL)
+                      PLAYER_SPEED, JUMP_SPEED, BLOCK_PIXEL_SIZE)
+from scripts.tiles import TILE_COUNT
 
 
 def clamp(minimum, x, maximum):
@@ -20,37 +19,47 @@ class Player(Object):
                                          self.pos[1],
                                          self.spr.get_width(),
                                          self.spr.get_height())
+        self.body = Body(self.pos[0], self.pos[1],
+                         self.rect.width, self.rect.height)
+        self.prev_pos = list(self.pos)  # where it was before this tick
+        self.draw_pos = list(self.pos)  # in between the two, for drawing
         self.currentblock = 0
         self.selected_block_chunky = 0
         self.selected_block_chunkx = 0
 
+    def place(self, pos):
+        # moves without anything in between to draw
+        self.pos = list(pos)
+        self.body.x, self.body.y = self.pos
+        self.body.vx = self.body.vy = 0.0
+        self.prev_pos = list(pos)
+        self.draw_pos = list(pos)
+
     def change_block(self, y: int):
-        self.currentblock = (self.currentblock+y) % len(TILES)
+        self.currentblock = (self.currentblock+y) % TILE_COUNT
 
     def move(self, dt):
+        # dt is the length of a tick in ms, which is always the same
         keys = key.get_pressed()
+        self.prev_pos = list(self.pos)
 
         xmov: int = 0
-        ymov: int = 0
-        if keys[K_w] or keys[K_UP]:
-            ymov = -1
-
         if keys[K_a] or keys[K_LEFT]:
             xmov = -1
 
-        if keys[K_s] or keys[K_DOWN]:
-            ymov = 1
-
         if keys[K_d] or keys[K_RIGHT]:
             xmov = 1
 
-        self.pos[0] += xmov*PLAYER_SPEED*dt*0.1
-        self.pos[1] += ymov*PLAYER_SPEED*dt*0.1
+        body = self.body
+        if (keys[K_w] or keys[K_UP] or keys[K_SPACE]) and body.on_ground:
+            body.vy = -JUMP_SPEED
+
+        body.vx = xmov*PLAYER_SPEED*100  # pixels per second
+        self.app.tile_manager.collider.step(body, dt/1000)
+        self.pos = [body.x, body.y]
         self.rect.x = self.pos[0]  # Maybe round or int this?
         self.rect.y = self.pos[1]
         self.app.tile_manager.set_centerpos(int(self.pos[0]))
-        self.camera.update_pos((int(self.pos[0] + CAMERA_OFFSET),
-                                int(self.pos[1] + CAMERA_OFFSET)))
         # Maybe make it CHUNK_HEIGHT?
         # I think making these int does kinda solve screen tearing/player
         # just moving 1 pixel too high up sometimes
@@ -58,35 +67,35 @@ class Player(Object):
     def block_calc(self, mpos):
         if mouse.get_pressed()[0]:
             outofbounds = False
-            blockx = int(mpos[0] + self.pos[0] + CAMERA_OFFSET)//BLOCK_PIXEL_SIZE
-            blocky = int((mpos[1] + self.pos[1] + CAMERA_OFFSET)//BLOCK_PIXEL_SIZE)
+            blockx = int(mpos[0] + self.camera.pos[0])//BLOCK_PIXEL_SIZE
+            blocky = int((mpos[1] + self.camera.pos[1])//BLOCK_PIXEL_SIZE)
 
             if clamp(0, blocky, CHUNK_HEIGHT-1) != blocky:
                 outofbounds = True
 
-            try:
-                selected_chunk = self.app.tile_manager.loaded_chunks[blockx // CHUNK_WIDTH]
-            except KeyError:
+            if blockx // CHUNK_WIDTH not in self.app.tile_manager.loaded_chunks:
                 outofbounds = True
 
             if not outofbounds:
                 self.selected_block_chunkx = blockx % CHUNK_WIDTH
                 self.selected_block_chunky = blocky
-                selected_chunk["tiledata"][self.selected_block_chunky][
-                    self.selected_block_chunkx] = self.currentblock
-
-                selected_chunk[
-                    "lightdata"] = self.app.tile_manager.generate_lightdata(
-                        selected_chunk["tiledata"], blockx//CHUNK_WIDTH)
-                selected_chunk["image"] = self.app.tile_manager.render_chunk(
-                    selected_chunk["tiledata"], selected_chunk["lightdata"])
+                # does nothing if the block is already the same
+                self.app.tile_manager.set_block(blockx, blocky,
+                                                self.currentblock)
 
     def update(self, dt, mpos):
         self.move(dt)
         self.block_calc(mpos)
 
+    def interpolate(self, alpha):
+        # alpha is how far into the next tick the frame is drawn,
+        # the camera follows the drawn position so the world doesn't jitter
+        self.draw_pos = [prev + (now - prev)*alpha
+                         for prev, now in zip(self.prev_pos, self.pos)]
+        self.camera.follow(self.draw_pos)
+
     def draw(self, surf):
-        pos_to_draw = (self.pos[0] - self.camera.pos[0],
-                       self.pos[1] - self.camera.pos[1])
+        pos_to_draw = (self.draw_pos[0] - self.camera.pos[0],
+                       self.draw_pos[1] - self.camera.pos[1])
         # draw.circle(surf, "red", pos_to_draw, 20)
         surf.blit(self.spr, pos_to_draw)
@@ -0,0 +1,125 @@
+"""
+Generates a range of chunks without starting the game and saves them
+into a world, so a map can be made before anyone plays on it.
+
+    python -m scripts.pregenerate SEED FIRST LAST [--world world]
+                                  [--workers N]
+
+Chunks FIRST to LAST (both included) are generated on every core with
+the same job the game's ChunkGenerator runs and written into the
+region files one region at a time while the workers carry on. Chunks
+the world already has saved are left alone, so it can be run on a
+world that has been played on. A new world gets an info.json with the
+player at chunk 0, an existing one has to have the same seed.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import json
+import os
+import sys
+import time
+from scripts.chunk import Chunk
+from scripts.chunk_generator import generate_chunk_job
+from scripts.chunk_index import GeneratedChunks
+from scripts.region import RegionStorage, region_of
+
+PROGRESS_INTERVAL = 1.0  # seconds between progress lines
+
+
+def load_info(info_path, seed):
+    if not os.path.exists(info_path):
+        return {
+            "player": {"chunkpos": 0, "playerpos": [0, 0], "inventory": []},
+            "generated_chunks": [],
+            "map_seed": seed,
+            }
+    with open(info_path, "r") as f:
+        map_data = json.load(f)
+    if map_data["map_seed"] != seed:
+        raise ValueError("the world has seed {}, not {}".format(
+            map_data["map_seed"], seed))
+    return map_data
+
+
+def pregenerate(seed, first, last, world_path="world", workers=None):
+    # returns (chunks generated, seconds it took, seconds spent in jobs)
+    chunk_path = os.path.join(world_path, "chunks")
+    info_path = os.path.join(world_path, "info.json")
+    os.makedirs(chunk_path, exist_ok=True)
+    map_data = load_info(info_path, seed)
+    storage = RegionStorage(chunk_path)
+
+    saved = set()
+    for region in range(region_of(first), region_of(last) + 1):
+        saved.update(storage.saved_chunks(region))
+    todo = [c for c in range(first, last + 1) if c not in saved]
+    if saved:
+        print(f"Skipping {last - first + 1 - len(todo)} chunks that are"
+              " already saved")
+
+    generated = GeneratedChunks.from_json(map_data["generated_chunks"])
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    next_progress = start + PROGRESS_INTERVAL
+    done = 0
+    busy = 0.0  # the time the jobs took added up
+    batch = []  # chunks of the region being collected
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # results come back in order, so every region is written once
+        jobs = executor.map(generate_chunk_job, repeat(seed), todo,
+                            chunksize=max(1, min(16, len(todo) // workers)))
+        for chunkpos, tiledata, lightdata, seconds in jobs:
+            if batch and region_of(chunkpos) != region_of(batch[0].chunkpos):
+                storage.save_chunks(batch)
+                batch = []
+            # saved chunks count as edited, otherwise the game would
+            # generate them again instead of loading them
+            batch.append(Chunk(chunkpos, tiledata, lightdata, edited=True))
+            generated.add(chunkpos)
+            done += 1
+            busy += seconds
+            now = time.perf_counter()
+            if now >= next_progress:
+                print("{}/{} chunks, {:.0f} chunks/s".format(
+                    done, len(todo), done / (now - start)))
+                next_progress = now + PROGRESS_INTERVAL
+        if batch:
+            storage.save_chunks(batch)
+
+    map_data["generated_chunks"] = generated.to_json()
+    with open(info_path, "w") as f:
+        json.dump(map_data, f)
+    return done, time.perf_counter() - start, busy
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Generate and save chunks of a pycraft world")
+    parser.add_argument("seed", type=int)
+    parser.add_argument("first", type=int, help="first chunk x")
+    parser.add_argument("last", type=int, help="last chunk x, included")
+    parser.add_argument("--world", default="world",
+                        help="world directory, made if it doesn't exist")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes, every core by default")
+    args = parser.parse_args(argv)
+    if args.last < args.first:
+        parser.error("last has to be at least first")
+
+    try:
+        count, seconds, busy = pregenerate(args.seed, args.first,
+                                           args.last, args.world,
+                                           args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print("Generated {} chunks in {:.2f} s, {:.0f} chunks/s".format(
+        count, seconds, count / seconds if seconds else 0))
+    if count:
+        # close to the worker count if the cores were kept busy
+        print("{:.2f} s of generating, {:.1f} chunks at a time".format(
+            busy, busy / seconds))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,171 @@
+from collections import deque
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+from pygame import draw
+
+FRAME_PARTS = ("input", "update", "draw")
+PART_COLORS = ((160, 160, 160), (255, 160, 40), (60, 220, 90))
+
+
+class Profiler:
+    """
+    Keeps the last few hundred frame times (split into input, update
+    and draw) and the most recent timings of anything else that gets
+    recorded, like chunks being generated, rendered, loaded or saved.
+    Recording is just a deque append so it's always on, the Chrome
+    trace (chrome://tracing or ui.perfetto.dev) is only collected
+    between start_trace() and stop_trace().
+
+    Chunks are loaded and saved on other threads, record() is safe to
+    call from any of them.
+    """
+
+    def __init__(self, history=240):
+        self.history = history
+        self.frames = deque(maxlen=history)  # (input, update, draw) seconds
+        self.timings = {}  # name: deque of seconds
+        self.counters = {}  # name: last value
+        self.lock = threading.Lock()
+        # (events, idents of the threads named in them) while a trace is
+        # running, one attribute so other threads never see half of it
+        self.trace = None
+        self.epoch = time.perf_counter()
+
+    def record(self, name, seconds, start=None):
+        timings = self.timings.get(name)
+        if timings is None:
+            with self.lock:
+                timings = self.timings.setdefault(
+                    name, deque(maxlen=self.history))
+        timings.append(seconds)
+        # read once, stop_trace() can set it to None from another thread
+        trace = self.trace
+        if trace is not None:
+            if start is None:
+                start = time.perf_counter() - seconds
+            self.trace_event(trace, name, start, seconds)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start)
+
+    def frame(self, start, after_input, after_update, after_draw):
+        # the four perf_counter() values around the parts of a frame
+        parts = (after_input - start, after_update - after_input,
+                 after_draw - after_update)
+        self.frames.append(parts)
+        trace = self.trace
+        if trace is not None:
+            begin = start
+            for name, seconds in zip(FRAME_PARTS, parts):
+                self.trace_event(trace, name, begin, seconds)
+                begin += seconds
+
+    def counter(self, name, value):
+        self.counters[name] = value
+        trace = self.trace
+        if trace is not None:
+            trace[0].append({
+                "name": name, "ph": "C", "pid": os.getpid(),
+                "ts": (time.perf_counter() - self.epoch) * 1e6,
+                "args": {name: value}})
+
+    def summary(self, name):
+        # (mean, max) in milliseconds of the recent timings
+        timings = list(self.timings.get(name, ()))
+        if not timings:
+            return 0.0, 0.0
+        return sum(timings) / len(timings) * 1000, max(timings) * 1000
+
+    def frame_summary(self):
+        # (mean, 99th percentile) in milliseconds of the whole frame
+        totals = sorted(sum(parts) for parts in self.frames)
+        if not totals:
+            return 0.0, 0.0
+        return (sum(totals) / len(totals) * 1000,
+                totals[min(len(totals)-1, int(len(totals)*0.99))] * 1000)
+
+    # chrome trace
+    @property
+    def tracing(self):
+        return self.trace is not None
+
+    def trace_event(self, trace, name, start, seconds):
+        events, named_threads = trace
+        thread = threading.current_thread()
+        if thread.ident not in named_threads:
+            # so the trace viewer shows the thread names
+            named_threads.add(thread.ident)
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": os.getpid(),
+                "tid": thread.ident, "args": {"name": thread.name}})
+        events.append({
+            "name": name, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+            "ts": (start - self.epoch) * 1e6, "dur": seconds * 1e6})
+
+    def start_trace(self):
+        self.trace = ([], set())
+
+    def stop_trace(self, path="trace.json"):
+        trace, self.trace = self.trace, None
+        if trace is None:
+            return None
+        events = trace[0]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+class ProfilerOverlay:
+    """
+    Rolling graph of the frame times, one pixel column per frame with
+    input, update and draw stacked, and a few lines of text under it.
+    """
+
+    def __init__(self, profiler, font, height=60, max_ms=33.4):
+        self.profiler = profiler
+        self.font = font
+        self.height = height
+        self.max_ms = max_ms  # frame time at the top of the graph
+
+    def draw(self, surf, pos):
+        x, y = pos
+        width = self.profiler.history
+        draw.rect(surf, (0, 0, 0), (x, y, width, self.height))
+        scale = self.height / self.max_ms
+        for i, parts in enumerate(self.profiler.frames):
+            bottom = y + self.height
+            for seconds, color in zip(parts, PART_COLORS):
+                size = seconds * 1000 * scale
+                if size >= 0.5:
+                    draw.line(surf, color, (x + i, bottom),
+                              (x + i, max(y, bottom - size)))
+                bottom -= size
+        # 60 fps line
+        line_y = y + self.height - 1000/60 * scale
+        draw.line(surf, (255, 60, 60), (x, line_y), (x + width, line_y))
+
+        mean, p99 = self.profiler.frame_summary()
+        lines = ["frame {:.1f} p99 {:.1f} ms".format(mean, p99)]
+        for name in ("generate", "light", "render", "load", "save"):
+            avg, worst = self.profiler.summary(name)
+            lines.append("{} {:.2f} max {:.2f} ms".format(name, avg, worst))
+        lines.append(" ".join("{}:{}".format(name, value) for name, value
+                              in self.profiler.counters.items()))
+        if self.profiler.tracing:
+            lines.append("tracing...")
+        text_y = y + self.height + 2
+        for line in lines:
+            surf.blit(self.font.render(line, False, "green"), (x, text_y))
+            text_y += self.font.get_height()
+
+
+# one for the whole game, chunks are loaded and saved on other threads
+profiler = Profiler()
@@ -0,0 +1,253 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from settings import (CHUNK_WIDTH, CHUNK_HEIGHT, SECTION_HEIGHT,
+                      REGION_SIZE)
+from scripts.chunk import Chunk, TILE_DTYPE, LIGHT_DTYPE
+
+# Region file layout, everything little endian:
+#   header:  magic b"PCRG", version, chunk width, chunk height, region size
+#   table:   REGION_SIZE entries of (offset, length, flags), length 0 means
+#            the chunk isn't in the file
+#   payload: per chunk, zlib compressed if flags & FLAG_ZLIB:
+#            tiledata bytes, lightdata bytes, entitydata as json
+#            with FLAG_SECTIONS the arrays are stored as the section height
+#            and then every section as either 0 and the one value the whole
+#            section has, or 1 and the section bytes
+MAGIC = b"PCRG"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH")
+ENTRY = struct.Struct("<III")
+FLAG_ZLIB = 1
+FLAG_SECTIONS = 2
+UNIFORM = 0
+RAW = 1
+TABLE_SIZE = ENTRY.size * REGION_SIZE
+DATA_START = HEADER.size + TABLE_SIZE
+TILE_BYTES = CHUNK_WIDTH * CHUNK_HEIGHT
+SECTION_BYTES = CHUNK_WIDTH * SECTION_HEIGHT
+
+
+class RegionError(ValueError):
+    """A region file that is cut off, corrupt or made for other chunk sizes."""
+
+
+def region_of(chunkpos):
+    return chunkpos // REGION_SIZE
+
+
+def encode_sections(array):
+    parts = []
+    for section in array.reshape(-1, SECTION_BYTES):
+        first = section[0]
+        if (section == first).all():
+            parts.append(bytes((UNIFORM, first)))
+        else:
+            parts.append(bytes((RAW,)) + section.tobytes())
+    return b"".join(parts)
+
+
+def decode_sections(buf, offset, dtype, section_height):
+    # returns the (CHUNK_HEIGHT, CHUNK_WIDTH) array and where it ended
+    section_bytes = CHUNK_WIDTH * section_height
+    array = np.empty((CHUNK_HEIGHT // section_height, section_bytes), dtype)
+    for section in array:
+        if buf[offset] == UNIFORM:
+            section.fill(buf[offset+1])
+            offset += 2
+        else:
+            section[:] = np.frombuffer(buf, dtype, section_bytes, offset+1)
+            offset += 1 + section_bytes
+    return array.reshape(CHUNK_HEIGHT, CHUNK_WIDTH), offset
+
+
+def encode_chunk(chunk, compress_level=6):
+    payload = (bytes((SECTION_HEIGHT,)) +
+               encode_sections(chunk.tiledata.astype(TILE_DTYPE, copy=False)) +
+               encode_sections(chunk.lightdata.astype(LIGHT_DTYPE,
+                                                      copy=False)) +
+               json.dumps(chunk.entitydata).encode())
+    if compress_level:
+        return zlib.compress(payload, compress_level), FLAG_ZLIB | FLAG_SECTIONS
+    return payload, FLAG_SECTIONS
+
+
+def decode_chunk(chunkpos, payload, flags):
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    buf = bytearray(payload)
+    if flags & FLAG_SECTIONS:
+        section_height = buf[0]
+        tiledata, end = decode_sections(buf, 1, TILE_DTYPE, section_height)
+        lightdata, end = decode_sections(buf, end, LIGHT_DTYPE,
+                                         section_height)
+    else:
+        # saved before sections, the arrays are views on the one
+        # decompressed buffer, not copies
+        tiledata = np.frombuffer(buf, TILE_DTYPE, TILE_BYTES).reshape(
+            CHUNK_HEIGHT, CHUNK_WIDTH)
+        lightdata = np.frombuffer(buf, LIGHT_DTYPE, TILE_BYTES,
+                                  TILE_BYTES).reshape(CHUNK_HEIGHT,
+                                                      CHUNK_WIDTH)
+        end = TILE_BYTES*2
+    entitydata = json.loads(bytes(buf[end:]) or b"[]")
+    return Chunk(chunkpos, tiledata, lightdata, entitydata, edited=True)
+
+
+class RegionStorage:
+    """
+    Stores chunks in region files with REGION_SIZE chunks each instead
+    of one json file per chunk. Reads mmap the file and only touch the
+    header and the one payload they need, writes rewrite the region
+    into a temp file and swap it in so a crash can't leave half a file.
+    """
+
+    def __init__(self, path="world/chunks/", compress_level=6):
+        self.path = path
+        self.compress_level = compress_level
+        self.lock = threading.Lock()
+
+    def region_path(self, region):
+        return os.path.join(self.path, f"{region}.region")
+
+    def read_table(self, data, file_size=None):
+        # file_size is the size of the whole file when data is only
+        # the header and table, the entries are checked against it
+        if len(data) < DATA_START:
+            raise RegionError("region file is cut off")
+        magic, version, width, height, size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RegionError("not a region file")
+        if (width, height, size) != (CHUNK_WIDTH, CHUNK_HEIGHT,
+                                     REGION_SIZE):
+            raise RegionError("region file was made with other chunk sizes")
+        table = [ENTRY.unpack_from(data, HEADER.size + i*ENTRY.size)
+                 for i in range(REGION_SIZE)]
+        if file_size is None:
+            file_size = len(data)
+        for offset, length, _ in table:
+            if length and (offset < DATA_START or
+                           offset + length > file_size):
+                raise RegionError("region file is cut off")
+        return table
+
+    def check(self):
+        # raises RegionError for the first region file this world can't
+        # read, so a world isn't opened just to fail on every chunk
+        with self.lock:
+            for name in sorted(os.listdir(self.path)):
+                if not name.endswith(".region"):
+                    continue
+                path = os.path.join(self.path, name)
+                with open(path, "rb") as f:
+                    data = f.read(DATA_START)
+                    try:
+                        self.read_table(data, os.fstat(f.fileno()).st_size)
+                    except RegionError as e:
+                        raise RegionError(f"{path}: {e}") from None
+
+    def load_chunk(self, chunkpos):
+        # a chunk that can't be read counts as not saved
+        path = self.region_path(region_of(chunkpos))
+        with self.lock:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                return None
+            with f:
+                try:
+                    return self.read_chunk(f, chunkpos)
+                except RegionError as e:
+                    print(f"Couldn't read chunk {chunkpos} from {path}: {e}")
+                    return None
+
+    def read_chunk(self, f, chunkpos):
+        if os.fstat(f.fileno()).st_size < DATA_START:
+            # mmap can't map an empty file
+            raise RegionError("region file is cut off")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset, length, flags = self.read_table(mm)[
+                chunkpos % REGION_SIZE]
+            if not length:
+                return None
+            with memoryview(mm) as view:
+                payload = view[offset:offset+length]
+                try:
+                    return decode_chunk(chunkpos, payload, flags)
+                except (ValueError, IndexError, ZeroDivisionError,
+                        zlib.error) as e:  # a payload that doesn't decode
+                    raise RegionError(f"chunk is corrupt: {e}") from None
+                finally:
+                    payload.release()
+
+    def saved_chunks(self, region):
+        # chunk positions that are in the region file, only reads the table
+        with self.lock:
+            try:
+                with open(self.region_path(region), "rb") as f:
+                    data = f.read(DATA_START)
+                    file_size = os.fstat(f.fileno()).st_size
+            except FileNotFoundError:
+                return []
+        return [region*REGION_SIZE + i
+                for i, (_, length, _) in enumerate(
+                    self.read_table(data, file_size))
+                if length]
+
+    def read_region(self, region):
+        # {index: (payload, flags)} with the payloads still compressed
+        entries = {}
+        try:
+            with open(self.region_path(region), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return entries
+        for i, (offset, length, flags) in enumerate(self.read_table(data)):
+            if length:
+                entries[i] = (data[offset:offset+length], flags)
+        return entries
+
+    def write_region(self, region, entries):
+        path = self.region_path(region)
+        if not entries:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        table = bytearray(TABLE_SIZE)
+        payloads = []
+        offset = DATA_START
+        for i in range(REGION_SIZE):
+            if i in entries:
+                payload, flags = entries[i]
+                ENTRY.pack_into(table, i*ENTRY.size,
+                                offset, len(payload), flags)
+                payloads.append(payload)
+                offset += len(payload)
+        with open(path + ".tmp", "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, CHUNK_WIDTH, CHUNK_HEIGHT,
+                                REGION_SIZE))
+            f.write(table)
+            f.writelines(payloads)
+        os.replace(path + ".tmp", path)
+
+    def save_chunks(self, chunks):
+        by_region = {}
+        for chunk in chunks:
+            by_region.setdefault(region_of(chunk.chunkpos), []).append(chunk)
+        with self.lock:
+            for region, region_chunks in by_region.items():
+                entries = self.read_region(region)
+                for chunk in region_chunks:
+                    entries[chunk.chunkpos % REGION_SIZE] = encode_chunk(
+                        chunk, self.compress_level)
+                self.write_region(region, entries)
+
+    def delete_all(self):
+        with self.lock:
+            for f in os.listdir(self.path):
+                if f.endswith(".region") or f.endswith(".chunk"):
+                    os.remove(os.path.join(self.path, f))
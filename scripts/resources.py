@@ -1,20 +1,31 @@
-from pygame import font, image, Surface
+from pygame import font, image, Surface, BLEND_RGB_MULT
 from settings import FONT_SIZE, SKY_COLOR
-from scripts.tiles import TILES
+from scripts.tiles import TEXTURE
+from scripts.tile_atlas import TileAtlas
 font.init()
 
 
 class Resources:
     def __init__(self):
         self.menufont = font.Font("appdata/misc/joystix monospace.ttf", FONT_SIZE)
+        self.tile_atlas = None
 
     def loadtextures(self):
+        # only loaded the first time a map is opened, the converted
+        # surfaces are kept for every map after that
+        if self.tile_atlas is not None:
+            return
         self.playertextures = {
             "idle": image.load("appdata/player/idle.png").convert_alpha()
             }
-        self.tile_sprs = {}
-        for i in TILES:
-            tile_surf = image.load("appdata/tiles/"+str(i.value)+".png"
+        # no mob sprites yet, they're a reddish player
+        mob = self.playertextures["idle"].copy()
+        mob.fill((255, 110, 110), special_flags=BLEND_RGB_MULT)
+        self.entitytextures = {"mob": mob}
+        self.tile_sprs = {}  # by texture index, tiles can share one
+        for texture in sorted(set(TEXTURE)):
+            tile_surf = image.load("appdata/tiles/"+str(texture)+".png"
                                    ).convert()
             # tile_surf.set_colorkey((0, 0, 0, 0))
-            self.tile_sprs[i.value] = tile_surf
+            self.tile_sprs[texture] = tile_surf
+        self.tile_atlas = TileAtlas.load(self.tile_sprs)
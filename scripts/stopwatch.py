@@ -0,0 +1,27 @@
+import time
+
+
+class Stopwatch:
+    """
+    Times the steps of something that happens once, like starting the
+    game or opening a map, lap() ends a step and names it.
+    """
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.laps = []  # (name, seconds)
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.laps.append((name, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.start
+
+    def report(self, title):
+        return "{}: {} (total {:.0f} ms)".format(
+            title, ", ".join("{} {:.0f} ms".format(name, secs*1000)
+                             for name, secs in self.laps),
+            self.total()*1000)
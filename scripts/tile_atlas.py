@@ -0,0 +1,78 @@
+import hashlib
+import os
+from pygame import error, image, rect, surface
+from settings import BLOCK_PIXEL_SIZE, LIGHT_LEVELS, TILE_ATLAS_CACHE
+
+
+class TileAtlas:
+    """
+    Every tile sprite, shaded for every light level, packed into one
+    surface. A row per texture (TEXTURE in tiles.py) and a column per
+    light level, so the rect of texture t at light level l is
+    rects[t * LIGHT_LEVELS + l], the same key the renderer uses.
+
+    The built atlas can be kept in TILE_ATLAS_CACHE as a png named
+    after a hash of the tile sprites and loaded from there next time,
+    for when there are enough tiles (or big enough ones) for shading
+    them all at every launch to add up.
+    """
+
+    def __init__(self, surf, tile_count):
+        self.surf = surf
+        self.tile_count = tile_count
+        self.rects = [rect.Rect(level*BLOCK_PIXEL_SIZE, tile*BLOCK_PIXEL_SIZE,
+                                BLOCK_PIXEL_SIZE, BLOCK_PIXEL_SIZE)
+                      for tile in range(tile_count)
+                      for level in range(LIGHT_LEVELS)]
+
+    @classmethod
+    def build(cls, tile_sprs):
+        tile_count = max(tile_sprs) + 1
+        surf = surface.Surface((LIGHT_LEVELS*BLOCK_PIXEL_SIZE,
+                                tile_count*BLOCK_PIXEL_SIZE))
+        surf.fill("black")
+        opacity_surf = surface.Surface((BLOCK_PIXEL_SIZE, BLOCK_PIXEL_SIZE))
+        opacity_surf.fill("black")
+        for tile, spr in tile_sprs.items():
+            for light_level in range(LIGHT_LEVELS):
+                # 15 is full light, 0 is pitch black
+                alpha = (LIGHT_LEVELS-1 - light_level)*17
+                pos = (light_level*BLOCK_PIXEL_SIZE, tile*BLOCK_PIXEL_SIZE)
+                if alpha >= 255:
+                    continue  # already black
+                surf.blit(spr, pos)
+                opacity_surf.set_alpha(alpha)
+                surf.blit(opacity_surf, pos)
+        return cls(surf, tile_count)
+
+    @classmethod
+    def load(cls, tile_sprs, cache_path=TILE_ATLAS_CACHE):
+        if not cache_path:
+            return cls.build(tile_sprs)
+        path = os.path.join(cache_path,
+                            "tile_atlas_{}.png".format(cache_key(tile_sprs)))
+        tile_count = max(tile_sprs) + 1
+        try:
+            return cls(image.load(path).convert(), tile_count)
+        except (OSError, error):
+            pass  # not built yet
+        atlas = cls.build(tile_sprs)
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            image.save(atlas.surf, path + ".tmp.png")
+            os.replace(path + ".tmp.png", path)
+        except (OSError, error) as e:
+            print(f"Couldn't save the tile atlas: {e}")
+        return atlas
+
+    def __len__(self):
+        return len(self.rects)
+
+
+def cache_key(tile_sprs):
+    # changes when any sprite or the way they are shaded changes
+    h = hashlib.sha1("{}:{}".format(BLOCK_PIXEL_SIZE, LIGHT_LEVELS).encode())
+    for tile in sorted(tile_sprs):
+        h.update(tile.to_bytes(2, "little"))
+        h.update(image.tobytes(tile_sprs[tile], "RGB"))
+    return h.hexdigest()[:16]
@@ -33,3 +33,28 @@ TRANSPARENT_BLOCKS = [
     TILES.RED_FLOWER.value,
     TILES.YELLOW_FLOWER.value,
     TILES.TREE_SAPLING.value]
+
+# things you walk through, everything else is solid. Trees are in the
+# background, a trunk is taller than anything can jump
+PASSABLE_BLOCKS = [
+    TILES.AIR.value,
+    TILES.LOG.value,
+    TILES.LEAVES.value,
+    TILES.DEAD_SHRUB.value,
+    TILES.GRASS_PLANT.value,
+    TILES.RED_FLOWER.value,
+    TILES.YELLOW_FLOWER.value,
+    TILES.TREE_SAPLING.value]
+
+# properties of every tile as flat lists indexed by tile id, so the hot
+# loops do a list lookup instead of going through the enum or an `in`
+TILE_COUNT = len(TILES)
+TRANSPARENT = [t in TRANSPARENT_BLOCKS for t in range(TILE_COUNT)]
+SOLID = [t not in PASSABLE_BLOCKS for t in range(TILE_COUNT)]
+# how much light is lost going into a tile, light still gets a few
+# tiles into solid blocks so the ground doesn't just turn black
+LIGHT_OPACITY = [1 if transparent else 4 for transparent in TRANSPARENT]
+# light given off by a tile, nothing glows yet
+LIGHT_EMISSION = [0] * TILE_COUNT
+# appdata/tiles/<texture>.png, also the tile's row in the tile atlas
+TEXTURE = list(range(TILE_COUNT))
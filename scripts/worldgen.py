@@ -0,0 +1,281 @@
+import numpy as np
+import opensimplex
+import random
+from settings import (CHUNK_WIDTH, CHUNK_HEIGHT,
+                      CHUNK_GROUND_BASE, PERLIN_MULTIPLIER)
+from scripts.tiles import TILES
+from scripts.chunk import new_tiledata
+from scripts.lighting import compute_chunk_light
+
+# tile ids as plain ints, going through the enum for every tile is slow
+AIR = TILES.AIR.value
+STONE = TILES.STONE.value
+GRASS_BLOCK = TILES.GRASS_BLOCK.value
+DIRT = TILES.DIRT.value
+SAND = TILES.SAND.value
+SNOW_BLOCK = TILES.SNOW_BLOCK.value
+LOG = TILES.LOG.value
+LEAVES = TILES.LEAVES.value
+CACTUS = TILES.CACTUS.value
+BEDROCK = TILES.BEDROCK.value
+COAL_ORE = TILES.COAL_ORE.value
+IRON_ORE = TILES.IRON_ORE.value
+GOLD_ORE = TILES.GOLD_ORE.value
+DIAMOND_ORE = TILES.DIAMOND_ORE.value
+GRASS_PLANT = TILES.GRASS_PLANT.value
+RED_FLOWER = TILES.RED_FLOWER.value
+YELLOW_FLOWER = TILES.YELLOW_FLOWER.value
+DEAD_SHRUB = TILES.DEAD_SHRUB.value
+
+
+def clamp_chunk_width(val):
+    return max(0, min(val, CHUNK_WIDTH-1))
+
+
+def clamp_chunk_height(val):
+    return max(0, min(val, CHUNK_HEIGHT-1))
+
+
+def calculate_biome(x, y):
+    val = opensimplex.noise2(x=x, y=y)
+    if val < -0.4:
+        return SNOW_BLOCK, SNOW_BLOCK
+    if val > 0.4:
+        return SAND, SAND
+    else:
+        return GRASS_BLOCK, DIRT
+
+
+def ground_levels(chunkpos):
+    # same math as the old per column noise2 calls, just for all 8 columns
+    xs = np.arange(chunkpos * CHUNK_WIDTH,
+                   (chunkpos+1) * CHUNK_WIDTH) * 0.6
+    noise = opensimplex.noise2array(xs/CHUNK_WIDTH/2, np.array([5.0]))[0]
+    # astype truncates towards zero just like int()
+    return xs, CHUNK_GROUND_BASE - (noise * PERLIN_MULTIPLIER).astype(int)
+
+
+def generate_base_terrain(chunkpos, biome_tile, biome_tile2):
+    """
+    Batched version of calc_block for a whole chunk.
+    Gives the exact same tiles for a seed, but evaluates the ground
+    and cave noise with noise2array and classifies blocks with
+    array ops instead of 8 + 512 scalar noise calls.
+    """
+    xs, ground = ground_levels(chunkpos)
+    tiledata = new_tiledata()  # starts as air
+
+    # rows above the highest ground level are all air, no need for noise
+    ystart = max(0, int(ground.min()))
+    ys = np.arange(ystart, CHUNK_HEIGHT)
+    cave_noise = opensimplex.noise2array(xs/CHUNK_WIDTH, ys*3/CHUNK_HEIGHT)
+
+    y = ys[:, None]
+    filled = y >= ground
+    cave = (((cave_noise > -0.9) & (cave_noise < -0.6)) |
+            (cave_noise > 0.7))
+    solid = filled & ~cave
+
+    rows = np.full(cave_noise.shape, AIR, dtype=tiledata.dtype)
+    rows[solid & (y == ground)] = biome_tile
+    below = solid & (y > ground)
+    deep = y > ground*1.3
+    rows[below & deep] = STONE
+    rows[below & ~deep] = biome_tile2
+
+    tiledata[ystart:] = rows
+    return tiledata
+
+
+def calc_block(x, y, ground_level, biome_tile, biome_tile2):
+    # scalar version of a single tile, generate_chunk_terrain uses the
+    # batched generate_base_terrain which has to give the same result,
+    # python -m scripts.benchmark --check compares the two
+    filled = True
+    block_to_use = 11
+    if y < ground_level:  # air
+        filled = False
+
+    if filled:
+        # to determine if its a cave
+        noise_val = opensimplex.noise2(x=x/CHUNK_WIDTH,
+                                       y=y*3/CHUNK_HEIGHT)
+        if ((noise_val > -0.9 and noise_val < -0.6) or
+                (noise_val > 0.7)):  # cave
+            block_to_use = AIR
+        else:
+            if y == ground_level:
+                block_to_use = biome_tile
+            if y > ground_level:
+                if y > ground_level*1.3:
+                    block_to_use = STONE
+                else:
+                    block_to_use = biome_tile2
+    if not filled:
+        block_to_use = AIR
+    return block_to_use
+
+
+def get_plant_types(biome_tile):
+    grassland = [GRASS_PLANT, GRASS_PLANT,
+                 GRASS_PLANT, GRASS_PLANT,
+                 RED_FLOWER, YELLOW_FLOWER]
+
+    desert = [DEAD_SHRUB, AIR]
+    arctic = [AIR]
+
+    if biome_tile == GRASS_BLOCK:
+        return grassland
+    elif biome_tile == SAND:
+        return desert
+    elif biome_tile == SNOW_BLOCK:
+        return arctic
+
+
+def can_place_structure(x, y, biome_tile, chunkdata, horizontal, vertical):
+    can_place = True
+    if chunkdata[y, x] == biome_tile:
+        for el1 in horizontal:
+            for el2 in vertical:
+                xval = clamp_chunk_width(el1)
+                yval = clamp_chunk_height(el2)
+                tile = chunkdata[yval, xval]
+                if (tile != AIR):
+                    can_place = False
+                    break
+    else:
+        can_place = False
+    return can_place
+
+
+def generate_vegetation(chunkdata, biome_tile, rng):
+    for _ in range(2):
+        # I dont want to create a new cache just so tree leaves
+        # dont cut out so I'm just gonna make it from 1 to 6
+        x = rng.randint(1, CHUNK_WIDTH-2)
+        for y in range(0, CHUNK_HEIGHT):
+            # current_tile = chunkdata[y][x]
+            if biome_tile == GRASS_BLOCK:
+                can_place = can_place_structure(
+                    x, y, biome_tile, chunkdata,
+                    [x-1, x, x+1], [y-1, y-2, y-3, y-4])
+
+                if can_place:
+                    place_tree(chunkdata, x, y)
+                    break  # stop going down
+            elif biome_tile == SAND:
+                can_place = can_place_structure(
+                    x, y, biome_tile, chunkdata, [x], [y-1, y-2, y-3])
+                if can_place:
+                    place_cactus(chunkdata, x, y)
+                    break
+            else:  # not a biome that has vegetation
+                break
+    plant_types = get_plant_types(biome_tile)
+    for x in range(0, CHUNK_WIDTH):
+        for y in range(0, CHUNK_HEIGHT):
+            if (chunkdata[y, x] == biome_tile and
+               chunkdata[y-1, x] == AIR):
+                if rng.choice([True, False]):
+                    chunkdata[y-1, x] = rng.choice(plant_types)
+                break  # stop going down
+
+
+def place_cactus(chunkdata, x, y):
+    yval = clamp_chunk_height(y-1)
+    xval = clamp_chunk_width(x)
+    chunkdata[yval, xval] = CACTUS
+    yval = clamp_chunk_height(y-2)
+    xval = clamp_chunk_width(x)
+    chunkdata[yval, xval] = CACTUS
+
+
+def place_tree(chunkdata, x, y):
+    chunkdata[clamp_chunk_height(y-1),
+              clamp_chunk_width(x)] = LOG
+    chunkdata[clamp_chunk_height(y-2),
+              clamp_chunk_width(x)] = LOG
+    chunkdata[clamp_chunk_height(y-3),
+              clamp_chunk_width(x)] = LOG
+    chunkdata[clamp_chunk_height(y-3),
+              clamp_chunk_width(x-1)] = LEAVES
+    chunkdata[clamp_chunk_height(y-3),
+              clamp_chunk_width(x+1)] = LEAVES
+    chunkdata[clamp_chunk_height(y-4),
+              clamp_chunk_width(x-1)] = LEAVES
+    chunkdata[clamp_chunk_height(y-4),
+              clamp_chunk_width(x)] = LEAVES
+    chunkdata[clamp_chunk_height(y-4),
+              clamp_chunk_width(x+1)] = LEAVES
+
+
+def generate_ores(chunkdata, rng):
+    # we have added every block now we can create ores, trees etc.
+    for _ in range(15):
+        val = rng.randint(0, 9)
+        xpos = rng.randint(0, CHUNK_WIDTH-1)
+        ypos = rng.randint(0, CHUNK_HEIGHT-1)
+        if chunkdata[ypos, xpos] == STONE:
+            orex, orey = xpos, ypos
+            # place iron
+            ore_direction = [rng.choice([-1, 0, 1]),
+                             rng.choice([-1, 0, 1])]
+            length = rng.choice([1, 2, 3])
+            size_multiplier = rng.choice([0, 1])
+            ore = generate_ore_type(val, orey, rng)
+            for i in range(length):
+                for xs in range(orex-size_multiplier, orex+size_multiplier):
+                    for ys in range(orey-size_multiplier, orey+size_multiplier):
+                        try:
+                            ys = ys + (i*ore_direction[1])
+                            xs = xs + (i*ore_direction[0])
+                            if chunkdata[ys, xs] == STONE:
+                                chunkdata[ys, xs] = ore
+                        except IndexError:  # If it goes beyond chunk bound
+                            pass
+
+
+def generate_ore_type(val, y, rng):
+    # coal will be everywhere and if the val is 4 or lower
+    # iron will be everywhere too and occurs if the val == 5 and 6
+    # gold will be if y<= CHUNK_HEIGHT*0.7 and val == 7
+    # diamons will be if y<= CHUNK_HEIGHT*0.7 and val == 8
+    if val <= 3:
+        return COAL_ORE
+    if val >= 4 and val <= 7:
+        return IRON_ORE
+    if val == 8 and y >= CHUNK_HEIGHT*0.8:
+        return GOLD_ORE
+    if val == 9 and y >= CHUNK_HEIGHT*0.8:
+        return DIAMOND_ORE
+    return rng.choice([COAL_ORE, IRON_ORE])
+
+
+def chunk_rng(seed, chunkpos):
+    # random.Random hashes strings with sha512, so this doesn't depend on
+    # PYTHONHASHSEED and neighbouring chunks get unrelated streams
+    return random.Random("{}:{}".format(seed, chunkpos))
+
+
+def generate_chunk_terrain(seed, chunkpos):
+    # opensimplex has to be seeded with the same seed already,
+    # everything random after the noise comes from the chunk's own rng
+    # so a chunk is always the same no matter when or where it's made
+    rng = chunk_rng(seed, chunkpos)
+    xstart = chunkpos * CHUNK_WIDTH
+    biome_tile, biome_tile2 = calculate_biome(xstart/CHUNK_WIDTH/64, 4)
+    chunkdata = generate_base_terrain(chunkpos, biome_tile, biome_tile2)
+
+    generate_ores(chunkdata, rng)
+    generate_vegetation(chunkdata, biome_tile, rng)
+
+    for x in range(0, CHUNK_WIDTH):  # bedrock
+        chunkdata[CHUNK_HEIGHT-1, x] = BEDROCK
+
+    return chunkdata
+
+
+def generate_lightdata(terraindata):
+    # only the chunk itself, light from the neighbours is added
+    # by the LightEngine once the chunk is loaded
+    return compute_chunk_light(terraindata)
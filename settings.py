@@ -1,20 +1,63 @@
 from pygame import RESIZABLE, SCALED
+from os import cpu_count
 
 WINDOW_SIZE = WINDOW_WIDTH, WINDOW_HIGHT = 500, 500
+# with SCALED the window is stretched when resized, without it
+# resizing shows more of the world
 FLAGS = SCALED | RESIZABLE
 
 CHUNK_RADIUS = 5
 CHUNK_WIDTH = 8
 CHUNK_HEIGHT = 64
+# chunks are rendered and saved in sections of this many rows, sections
+# that are one tile all the way through cost next to nothing
+SECTION_HEIGHT = 16
+SECTIONS = CHUNK_HEIGHT // SECTION_HEIGHT
 CHUNK_GROUND_BASE = int(CHUNK_HEIGHT - (CHUNK_HEIGHT * 0.7))
 
+# processes used to generate chunks, one core is left for the game itself
+CHUNK_GEN_WORKERS = max(1, (cpu_count() or 2) - 1)
+
+REGION_SIZE = 32  # chunks per region file
+CHUNK_WRITE_DELAY = 0.5  # seconds to collect unloaded chunks before saving
+SAVE_TIMEOUT = 5  # max seconds to wait for chunks to be saved on exit
+
+# recently unloaded chunks are kept in memory until one of these is hit
+CHUNK_CACHE_SIZE = 32  # chunks
+CHUNK_CACHE_BYTES = 64 * 1024 * 1024
+CHUNK_CACHE_SURFACES = True  # keep the rendered images too
+
 PERLIN_MULTIPLIER = 10
 BLOCK_PIXEL_SIZE = 16  # size of each block in terms of pixels
+LIGHT_LEVELS = 16  # light goes from 0 to 15
 
 FONT_SIZE = 18
-
-CAMERA_OFFSET = - WINDOW_WIDTH//2
+# folder to keep the shaded tile atlas in between launches, None builds
+# it every time. With 21 16px tiles building it is as fast as loading it
+TILE_ATLAS_CACHE = None
+# F3 shows the frame time graph, F2 starts and stops recording a trace
+# into this file, open it in chrome://tracing or ui.perfetto.dev
+TRACE_PATH = "trace.json"
 
 PLAYER_SPEED = 3  # 3
+# in pixels and seconds
+GRAVITY = 1600
+MAX_FALL_SPEED = 800
+JUMP_SPEED = 360  # a bit over two blocks high
+STEP_HEIGHT = BLOCK_PIXEL_SIZE  # walks up ledges this high without jumping
+
+# seconds per frame path searches can take, longer ones carry on next frame
+PATH_BUDGET = 0.002
+PATH_MAX_NODES = 20000  # a search gives up after looking at this many tiles
+PATH_CACHE_SIZE = 256
+
+# the world is simulated in fixed ticks no matter how fast it's drawn,
+# slow frames run more ticks and the drawing is interpolated in between
+TICK_RATE = 60  # ticks per second
+MAX_FPS = 60
+MAX_TICKS_PER_FRAME = 5  # after that the game slows down instead
+# seconds per frame that can go to rendering new chunks, the rest of
+# them are left for the next frames (at least one chunk is always done)
+CHUNK_RENDER_BUDGET = 0.004
 
 SKY_COLOR = (99, 155, 255)